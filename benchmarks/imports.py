@@ -0,0 +1,78 @@
+"""Benchmark how long loading the zagonel integration and its platforms takes.
+
+    python -m benchmarks.imports --repeat 5
+
+Each module is imported in a fresh interpreter that already loaded what Home
+Assistant itself would have, so the times are what the integration adds.
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+from collections.abc import Iterable
+
+PACKAGE = "custom_components.zagonel"
+
+# Loaded by Home Assistant before any integration
+PRELOADED = (
+    "homeassistant.config_entries",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.helpers.entity_platform",
+    "homeassistant.helpers.storage",
+    "homeassistant.helpers.update_coordinator",
+)
+
+MODULES = (
+    PACKAGE,
+    f"{PACKAGE}.hub",
+    f"{PACKAGE}.config_flow",
+    f"{PACKAGE}.climate",
+    f"{PACKAGE}.light",
+    f"{PACKAGE}.number",
+    f"{PACKAGE}.select",
+    f"{PACKAGE}.sensor",
+    f"{PACKAGE}.time",
+)
+
+SCRIPT = """
+import importlib, sys, time
+for name in {preloaded!r}:
+    importlib.import_module(name)
+start = time.perf_counter()
+importlib.import_module({module!r})
+print(time.perf_counter() - start, "paho.mqtt.client" in sys.modules)
+"""
+
+
+def time_import(module: str) -> tuple[float, bool]:
+    """Import module in a fresh interpreter, return seconds taken and if paho was loaded."""
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(preloaded=PRELOADED, module=module)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    return float(output[0]), output[1] == "True"
+
+
+def main(args: Iterable[str] | None = None) -> None:
+    """Time every module and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    options = parser.parse_args(args)
+
+    print(f"{'module':<36} {'median ms':>10} {'min ms':>8} {'paho':>5}")
+    for module in options.modules:
+        runs = [time_import(module) for _ in range(options.repeat)]
+        seconds = [run[0] for run in runs]
+        print(
+            f"{module:<36} {statistics.median(seconds) * 1000:>10.1f} "
+            f"{min(seconds) * 1000:>8.1f} {'yes' if runs[0][1] else 'no':>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark the memory each zagonel device costs, by module.
+
+    python -m benchmarks.memory --devices 1000
+
+A first device is set up before tracing starts, so loading the platforms is
+left out and what remains is the cost of every further device.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import tracemalloc
+from collections.abc import Iterable
+
+from homeassistant import config_entries
+
+from custom_components.zagonel.const import (
+    CONF_DEVICE_ID,
+    CONF_PLATFORMS,
+    DATA_HUBS,
+    DOMAIN,
+)
+from custom_components.zagonel.hub import broker_settings
+
+from .run import SIMULATED_BROKER, async_start_hass
+from .simulator import ZagonelSimulatedHub, simulated_showers
+
+
+def _module(filename: str) -> str:
+    """Shorten the path of a source file to the package it belongs to."""
+    parts = filename.split(os.sep)
+    for root in ("zagonel", "homeassistant"):
+        if root in parts:
+            return "/".join(parts[len(parts) - parts[::-1].index(root) - 1:])
+    return parts[-1]
+
+
+async def async_measure(
+        devices: int, platforms: list[str] | None = None
+) -> tuple[float, dict[str, float]]:
+    """Set up devices, return bytes per device in total and by module."""
+    showers = simulated_showers(devices)
+    entries = [
+        config_entries.ConfigEntry(
+            version=1,
+            domain=DOMAIN,
+            title=device_id,
+            data={CONF_DEVICE_ID: device_id, **SIMULATED_BROKER},
+            options={CONF_PLATFORMS: platforms} if platforms else {},
+            source=config_entries.SOURCE_USER,
+        )
+        for device_id in showers
+    ]
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await async_start_hass(config_dir)
+        hub = ZagonelSimulatedHub(hass.loop, showers)
+        hass.data.setdefault(DOMAIN, {}).setdefault(DATA_HUBS, {})[broker_settings(SIMULATED_BROKER)] = hub
+        try:
+            await hass.config_entries.async_add(entries[0])
+            await hass.async_block_till_done()
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            await asyncio.gather(*map(hass.config_entries.async_add, entries[1:]))
+            await hass.async_block_till_done()
+            after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        finally:
+            await hass.async_stop(force=True)
+
+    measured = max(devices - 1, 1)
+    by_module: dict[str, float] = {}
+    for stat in after.compare_to(before, "filename"):
+        module = _module(stat.traceback[0].filename)
+        by_module[module] = by_module.get(module, 0) + stat.size_diff / measured
+    return sum(by_module.values()), by_module
+
+
+def main(args: Iterable[str] | None = None) -> None:
+    """Measure and print the memory per device, largest modules first."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--platforms", nargs="+", help="platforms to set up, every one without it")
+    parser.add_argument("--top", type=int, default=15)
+    options = parser.parse_args(args)
+    logging.basicConfig(level=logging.CRITICAL)
+
+    total, by_module = asyncio.run(async_measure(options.devices, options.platforms))
+    print(f"{options.devices} devices, {total / 1024:.1f} KiB per device")
+    for module, size in sorted(by_module.items(), key=lambda item: -item[1])[:options.top]:
+        print(f"{size / 1024:>10.2f} KiB  {module}")
+
+
+if __name__ == "__main__":
+    main()
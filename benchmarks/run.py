@@ -0,0 +1,251 @@
+"""Benchmark the zagonel integration against simulated showers.
+
+    python -m benchmarks.run --devices 1 10 100 1000
+
+The showers run in-process unless --host points at a local MQTT broker, in
+which case they answer through it from paho's network thread.
+
+Memory per device includes loading the platforms once, so it is only
+representative from a few devices up. --platforms narrows the platforms set
+up for each device, as the options of an entry do.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from homeassistant import config_entries, loader
+from homeassistant.const import CONF_HOST, CONF_PORT, EVENT_STATE_CHANGED
+from homeassistant.core import CoreState, HomeAssistant
+from homeassistant.helpers import (
+    area_registry,
+    device_registry,
+    entity,
+    entity_registry,
+    issue_registry,
+)
+
+from custom_components.zagonel.const import (
+    CONF_DEVICE_ID,
+    CONF_PLATFORMS,
+    CONF_TLS,
+    CONF_TRANSPORT,
+    DATA_HUBS,
+    DOMAIN,
+)
+from custom_components.zagonel.coordinator import ZagonelDataUpdateCoordinator
+from custom_components.zagonel.hub import broker_settings
+
+from .simulator import (
+    SimulatedShower,
+    ZagonelBrokerSimulator,
+    ZagonelSimulatedHub,
+    simulated_showers,
+)
+
+# In-process showers are reached through a hub seeded under this broker
+SIMULATED_BROKER = {CONF_HOST: "simulated", CONF_PORT: 0, CONF_TRANSPORT: "tcp", CONF_TLS: False}
+
+
+@dataclass
+class BenchmarkResult:
+    """Measurements at one device count."""
+
+    devices: int
+    memory_per_device: float
+    latency_p50: float
+    latency_p95: float
+    latency_max: float
+    update_cost: float
+    writes_per_second: float
+    writes_per_update: float
+
+    def row(self) -> str:
+        """Format as a table row."""
+        return (
+            f"{self.devices:>7} {self.memory_per_device / 1024:>10.1f} "
+            f"{self.latency_p50 * 1000:>8.2f} {self.latency_p95 * 1000:>8.2f} {self.latency_max * 1000:>8.2f} "
+            f"{self.update_cost * 1e6:>10.1f} {self.writes_per_second:>10.0f} {self.writes_per_update:>8.2f}"
+        )
+
+
+HEADER = (
+    f"{'devices':>7} {'KiB/dev':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} "
+    f"{'us/update':>10} {'writes/s':>10} {'w/update':>8}"
+)
+
+
+async def async_start_hass(config_dir: str) -> HomeAssistant:
+    """Start a bare Home Assistant with the registries the integration needs."""
+    hass = HomeAssistant()
+    hass.config.config_dir = config_dir
+    hass.config.skip_pip = True
+    hass.data[loader.DATA_CUSTOM_COMPONENTS] = None
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    entity.async_setup(hass)
+    await asyncio.gather(
+        area_registry.async_load(hass),
+        device_registry.async_load(hass),
+        entity_registry.async_load(hass),
+        issue_registry.async_load(hass),
+    )
+    hass.state = CoreState.running
+    return hass
+
+
+async def async_wait_for(condition: Callable[[], bool], timeout: float = 60) -> None:
+    """Wait until condition holds."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Simulated showers didn't answer in time")
+        await asyncio.sleep(0.005)
+
+
+async def async_latencies(
+        coordinators: list[ZagonelDataUpdateCoordinator], rounds: int
+) -> list[float]:
+    """Time getStatus on every device at once, rounds times."""
+
+    async def timed(request: Awaitable[Any]) -> float:
+        start = time.perf_counter()
+        await request
+        return time.perf_counter() - start
+
+    latencies: list[float] = []
+    for _ in range(rounds):
+        latencies += await asyncio.gather(*(
+            timed(coordinator.client.send_command({"command": "getStatus"}))
+            for coordinator in coordinators
+        ))
+    return latencies
+
+
+async def async_run(
+        devices: int,
+        rounds: int,
+        broker: dict[str, Any] | None = None,
+        platforms: list[str] | None = None,
+) -> BenchmarkResult:
+    """Set up devices entries and measure them."""
+    showers = simulated_showers(devices)
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await async_start_hass(config_dir)
+        simulator: ZagonelBrokerSimulator | None = None
+        if broker:
+            simulator = ZagonelBrokerSimulator(
+                showers, broker[CONF_HOST], broker[CONF_PORT], broker[CONF_TRANSPORT]
+            )
+            await hass.async_add_executor_job(simulator.start)
+            push: Callable[[SimulatedShower, dict], None] = simulator.push
+        else:
+            broker = SIMULATED_BROKER
+            hub = ZagonelSimulatedHub(hass.loop, showers)
+            hass.data.setdefault(DOMAIN, {}).setdefault(DATA_HUBS, {})[broker_settings(broker)] = hub
+
+            def push(shower: SimulatedShower, message: dict) -> None:
+                hub.push(shower.message_topic, message)
+
+        try:
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+            await asyncio.gather(*(
+                hass.config_entries.async_add(config_entries.ConfigEntry(
+                    version=1,
+                    domain=DOMAIN,
+                    title=device_id,
+                    data={CONF_DEVICE_ID: device_id, **broker},
+                    options={CONF_PLATFORMS: platforms} if platforms else {},
+                    source=config_entries.SOURCE_USER,
+                ))
+                for device_id in showers
+            ))
+            await hass.async_block_till_done()
+            memory = tracemalloc.get_traced_memory()[0] - baseline
+            tracemalloc.stop()
+
+            coordinators: list[ZagonelDataUpdateCoordinator] = [
+                coordinator for coordinator in hass.data[DOMAIN].values()
+                if isinstance(coordinator, ZagonelDataUpdateCoordinator)
+            ]
+            if len(coordinators) != devices:
+                raise RuntimeError(f"Only {len(coordinators)} of {devices} devices were set up")
+
+            latencies = await async_latencies(coordinators, rounds)
+
+            writes = 0
+
+            def count_write(_event) -> None:
+                nonlocal writes
+                writes += 1
+
+            remove_listener = hass.bus.async_listen(EVENT_STATE_CHANGED, count_write)
+            received = sum(coordinator.client.metrics.messages.total for coordinator in coordinators)
+            start = time.perf_counter()
+            for round_index in range(rounds):
+                for shower in showers.values():
+                    # Power and flow change together while a shower runs
+                    push(shower, shower.update_status(Pw=10000 + round_index, Fl=5000 + round_index))
+            expected = received + devices * rounds
+            await async_wait_for(lambda: sum(
+                coordinator.client.metrics.messages.total for coordinator in coordinators
+            ) >= expected)
+            await hass.async_block_till_done()
+            elapsed = time.perf_counter() - start
+            remove_listener()
+        finally:
+            await hass.async_stop(force=True)
+            if simulator:
+                await asyncio.get_running_loop().run_in_executor(None, simulator.stop)
+
+    latencies.sort()
+    updates = devices * rounds
+    return BenchmarkResult(
+        devices=devices,
+        memory_per_device=memory / devices,
+        latency_p50=statistics.median(latencies),
+        latency_p95=latencies[int(0.95 * (len(latencies) - 1))],
+        latency_max=latencies[-1],
+        update_cost=elapsed / updates,
+        writes_per_second=writes / elapsed,
+        writes_per_update=writes / updates,
+    )
+
+
+def main(args: Iterable[str] | None = None) -> None:
+    """Run the benchmarks and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--host", help="local MQTT broker, showers run in-process without it")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--transport", choices=("tcp", "websockets"), default="tcp")
+    parser.add_argument("--platforms", nargs="+", help="platforms to set up, every one without it")
+    options = parser.parse_args(args)
+    logging.basicConfig(level=logging.ERROR)
+
+    broker = None
+    if options.host:
+        broker = {
+            CONF_HOST: options.host,
+            CONF_PORT: options.port,
+            CONF_TRANSPORT: options.transport,
+            CONF_TLS: False,
+        }
+    print(HEADER)
+    for devices in options.devices:
+        result = asyncio.run(async_run(devices, options.rounds, broker, options.platforms))
+        print(result.row())
+
+
+if __name__ == "__main__":
+    main()
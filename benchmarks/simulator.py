@@ -0,0 +1,237 @@
+"""Simulated Zagonel showers, in-process or behind a local MQTT broker.
+
+Run against a broker with:
+
+    python -m benchmarks.simulator --host 127.0.0.1 --port 1883 --transport tcp --devices 100
+
+The devices are named sim0, sim1 and so on.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import signal
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+import paho.mqtt.client as mqtt
+
+from custom_components.zagonel.hub import ZagonelMqttHub, ZagonelStartupThrottle
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def default_chars(device_id: str) -> dict[str, Any]:
+    """Chars of a shower fresh out of the box."""
+    return {
+        "Type": "Chars",
+        "Device_Id": device_id,
+        "Control_Mode": 0,
+        "Rgb_Mode": 0,
+        "Rgb_Color": "#FF0000",
+        "Buzzer_Volume": 10,
+        "Parental_Mode": 0,
+        "Parental_Limit": 600,
+        "Preset_1": 38000,
+        "Preset_2": 39000,
+        "Preset_3": 40000,
+        "Preset_4": 41000,
+    }
+
+
+def default_status() -> dict[str, Any]:
+    """Status of an idle shower."""
+    return {
+        "Type": "Status",
+        "St": "IDL",
+        "Fl": 0,
+        "Vi": 220000,
+        "Ti": 20,
+        "To": 25000,
+        "Ts": 38000,
+        "Ps": 0,
+        "De": 8000,
+        "Pw": 0,
+        "Hp": 0,
+        "Up": 1,
+        "Pp": 0,
+        "Wi": -50,
+    }
+
+
+@dataclass
+class SimulatedShower:
+    """A shower answering commands the way the real one does."""
+
+    device_id: str
+    chars: dict[str, Any] = None
+    status: dict[str, Any] = field(default_factory=default_status)
+
+    def __post_init__(self) -> None:
+        """Fill in the chars of the device."""
+        if self.chars is None:
+            self.chars = default_chars(self.device_id)
+
+    @property
+    def command_topic(self) -> str:
+        """Topic the device listens on."""
+        return f"{self.device_id}_AS"
+
+    @property
+    def message_topic(self) -> str:
+        """Topic the device publishes on."""
+        return f"{self.device_id}_SA"
+
+    def handle(self, payload: dict[str, Any]) -> dict[str, Any] | None:
+        """Reply to a command, None when the device ignores it."""
+        command = payload.get("command")
+        if command == "getStatus":
+            return self.status
+        if command == "getChars":
+            # The shower doesn't answer getChars while running
+            return None if self.status["St"] == "RUN" else self.chars
+        if command in self.chars:
+            # Setters are acknowledged by the whole Chars, echoing the new value
+            self.chars[command] = payload.get("value")
+            return self.chars
+        return None
+
+    def update_status(self, **values: Any) -> dict[str, Any]:
+        """Change the status, returning the message the device pushes."""
+        self.status.update(values)
+        return self.status
+
+
+def simulated_showers(count: int, prefix: str = "sim") -> dict[str, SimulatedShower]:
+    """Build count showers, by device id."""
+    return {
+        device_id: SimulatedShower(device_id)
+        for device_id in (f"{prefix}{index}" for index in range(count))
+    }
+
+
+class ZagonelSimulatedHub(ZagonelMqttHub):
+    """Hub answering from simulated showers in-process, without any broker."""
+
+    def __init__(
+            self,
+            loop: asyncio.AbstractEventLoop,
+            showers: dict[str, SimulatedShower],
+            latency: float = 0.0,
+    ) -> None:
+        """Initialize."""
+        super().__init__(loop)
+        self.showers = showers
+        self.latency = latency
+        # Nothing to protect, start every device at once
+        self.startup = ZagonelStartupThrottle(loop, concurrency=len(showers) or 1, stagger=0)
+
+    def is_connected(self) -> bool:
+        """is_connected."""
+        return self._connected.is_set()
+
+    async def async_connect(self) -> None:
+        """Connect to the simulated showers."""
+        if not self._connected.is_set():
+            self.stats.connects += 1
+            self._connected.set()
+
+    def disconnect(self) -> None:
+        """Disconnect from the simulated showers."""
+        self._connected.clear()
+
+    def _subscribe(self, topic: str) -> None:
+        """Subscriptions only route messages in-process."""
+
+    async def async_publish(self, topic: str, payload: str) -> None:
+        """Deliver payload to the simulated shower listening on topic."""
+        if (shower := self.showers.get(topic.removesuffix("_AS"))) is None:
+            return
+        if (reply := shower.handle(json.loads(payload))) is not None:
+            self._loop.call_later(self.latency, self.push, shower.message_topic, reply)
+
+    def push(self, topic: str, message: dict[str, Any]) -> None:
+        """Deliver a message published by a shower."""
+        mqtt_message = mqtt.MQTTMessage(topic=topic.encode())
+        mqtt_message.payload = json.dumps(message).encode()
+        self._on_message(None, None, mqtt_message)
+
+
+class ZagonelBrokerSimulator:
+    """Simulated showers talking to a real MQTT broker."""
+
+    def __init__(
+            self,
+            showers: dict[str, SimulatedShower],
+            host: str,
+            port: int,
+            transport: str = "tcp",
+    ) -> None:
+        """Initialize."""
+        self.showers = showers
+        self._host = host
+        self._port = port
+        self._client = mqtt.Client(transport=transport)
+        self._client.on_connect = self._on_connect
+        self._client.on_message = self._on_message
+
+    def start(self) -> None:
+        """Connect and answer commands from paho's network thread."""
+        self._client.connect(self._host, self._port)
+        self._client.loop_start()
+
+    def stop(self) -> None:
+        """Disconnect."""
+        self._client.disconnect()
+        self._client.loop_stop()
+
+    def push(self, shower: SimulatedShower, message: dict[str, Any]) -> None:
+        """Publish a message from shower."""
+        self._client.publish(shower.message_topic, json.dumps(message))
+
+    def _on_connect(self, _client, _userdata, _flags, _reason) -> None:
+        """Listen for the commands of every shower."""
+        self._client.subscribe([(shower.command_topic, 0) for shower in self.showers.values()])
+
+    def _on_message(self, _client, _userdata, message: mqtt.MQTTMessage) -> None:
+        """Answer a command."""
+        shower = self.showers.get(message.topic.removesuffix("_AS"))
+        if shower is None:
+            return
+        if (reply := shower.handle(json.loads(message.payload))) is not None:
+            self.push(shower, reply)
+
+
+def main(args: Iterable[str] | None = None) -> None:
+    """Run simulated showers against a broker until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--transport", choices=("tcp", "websockets"), default="tcp")
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--prefix", default="sim")
+    options = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO)
+
+    # Blocked before paho's thread starts, so only sigwait sees them
+    signals = {signal.SIGINT, signal.SIGTERM}
+    signal.pthread_sigmask(signal.SIG_BLOCK, signals)
+    simulator = ZagonelBrokerSimulator(
+        simulated_showers(options.devices, options.prefix),
+        options.host,
+        options.port,
+        options.transport,
+    )
+    simulator.start()
+    _LOGGER.info("Simulating %s showers on %s:%s", options.devices, options.host, options.port)
+    try:
+        signal.sigwait(signals)
+    finally:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,45 @@ https://github.com/ludeeus/zagonel
 """
 from __future__ import annotations
 
+import importlib
+from datetime import timedelta
+from types import ModuleType
+from typing import TYPE_CHECKING
+
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import config_validation as cv, entity_registry as er
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.typing import ConfigType
 
 from .api import ZagonelApiClient
-from .const import CONF_DEVICE_ID, DOMAIN
-from .coordinator import ZagonelDataUpdateCoordinator
+from .const import (
+    CONF_DEVICE_ID,
+    CONF_IDLE_INTERVAL,
+    CONF_MAX_BACKOFF,
+    CONF_PLATFORMS,
+    CONF_REFRESH_WINDOW,
+    CONF_RUNNING_INTERVAL,
+    CONF_STALE_AFTER,
+    DEFAULT_IDLE_INTERVAL,
+    DEFAULT_MAX_BACKOFF,
+    DEFAULT_REFRESH_WINDOW,
+    DEFAULT_RUNNING_INTERVAL,
+    DEFAULT_STALE_AFTER,
+    DOMAIN,
+    OPTION_PLATFORM_LEFT_OUT,
+    STORAGE_VERSION,
+)
+from .coordinator import (
+    ZagonelDataUpdateCoordinator,
+    session_storage_key,
+    storage_key,
+)
+from .services import async_setup_services
+
+if TYPE_CHECKING:
+    from .hub import ZagonelMqttHub
 
 PLATFORMS: list[Platform] = [
     Platform.CLIMATE,
@@ -23,34 +55,120 @@ PLATFORMS: list[Platform] = [
 ]
 
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Register the services, shared by every entry."""
+    async_setup_services(hass)
+    return True
+
+
+async def async_import_hub(hass: HomeAssistant) -> ModuleType:
+    """Import the mqtt hub, and paho with it, in the executor."""
+    return await hass.async_add_executor_job(importlib.import_module, f"{__name__}.hub")
+
+
 # https://developers.home-assistant.io/docs/config_entries_index/#setting-up-an-entry
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up this integration using UI."""
     hass.data.setdefault(DOMAIN, {})
+    hub = (await async_import_hub(hass)).async_get_hub(hass, {**entry.data, **entry.options})
     hass.data[DOMAIN][entry.entry_id] = _coordinator = ZagonelDataUpdateCoordinator(
         hass=hass,
         client=ZagonelApiClient(
             device_id=entry.data[CONF_DEVICE_ID],
+            hub=hub,
         ),
+        running_interval=timedelta(seconds=entry.options.get(
+            CONF_RUNNING_INTERVAL, DEFAULT_RUNNING_INTERVAL.total_seconds()
+        )),
+        idle_interval=timedelta(seconds=entry.options.get(
+            CONF_IDLE_INTERVAL, DEFAULT_IDLE_INTERVAL.total_seconds()
+        )),
+        max_backoff=timedelta(seconds=entry.options.get(
+            CONF_MAX_BACKOFF, DEFAULT_MAX_BACKOFF.total_seconds()
+        )),
+        refresh_window=entry.options.get(CONF_REFRESH_WINDOW, DEFAULT_REFRESH_WINDOW),
+        stale_after=timedelta(seconds=entry.options.get(
+            CONF_STALE_AFTER, DEFAULT_STALE_AFTER.total_seconds()
+        )),
     )
     # https://developers.home-assistant.io/docs/integration_fetching_data#coordinated-single-api-poll-for-data-for-all-entities
-    await _coordinator.async_config_entry_first_refresh()
+    try:
+        if await _coordinator.async_load_cache():
+            # Entities come from the cache, the live data follows in the background
+            entry.async_create_background_task(
+                hass, _async_throttled_refresh(hub, _coordinator), f"{DOMAIN} {entry.title} refresh"
+            )
+        else:
+            async with hub.startup.async_slot():
+                await _coordinator.async_config_entry_first_refresh()
+    except Exception:
+        # Give the shared connection back before setup is retried
+        _coordinator.release()
+        hass.data[DOMAIN].pop(entry.entry_id)
+        raise
 
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    _coordinator.platforms = entry.options.get(CONF_PLATFORMS, PLATFORMS)
+    _async_disable_left_out_entities(hass, entry, _coordinator.platforms)
+    await hass.config_entries.async_forward_entry_setups(entry, _coordinator.platforms)
     entry.async_on_unload(entry.add_update_listener(async_reload_entry))
 
     return True
 
 
+@callback
+def _async_disable_left_out_entities(hass: HomeAssistant, entry: ConfigEntry, platforms: list[str]) -> None:
+    """Disable the entities of platforms left out, enabling them again once back.
+
+    They would otherwise linger as unavailable. Disabling instead of removing
+    them keeps their names, areas and customizations.
+    """
+    registry = er.async_get(hass)
+    for entity_entry in er.async_entries_for_config_entry(registry, entry.entry_id):
+        left_out = entity_entry.options.get(DOMAIN, {}).get(OPTION_PLATFORM_LEFT_OUT, False)
+        if entity_entry.domain not in platforms:
+            if entity_entry.disabled_by is None:
+                registry.async_update_entity(
+                    entity_entry.entity_id, disabled_by=er.RegistryEntryDisabler.INTEGRATION
+                )
+                registry.async_update_entity_options(
+                    entity_entry.entity_id, DOMAIN, {OPTION_PLATFORM_LEFT_OUT: True}
+                )
+                # The unloaded entity left its state behind as unavailable
+                hass.states.async_remove(entity_entry.entity_id)
+        elif left_out:
+            # Only undo what was done here, not entities disabled by default or by the user
+            registry.async_update_entity_options(entity_entry.entity_id, DOMAIN, None)
+            if entity_entry.disabled_by is er.RegistryEntryDisabler.INTEGRATION:
+                registry.async_update_entity(entity_entry.entity_id, disabled_by=None)
+
+
+async def _async_throttled_refresh(hub: ZagonelMqttHub, coordinator: ZagonelDataUpdateCoordinator) -> None:
+    """Refresh once a startup slot is free."""
+    async with hub.startup.async_slot():
+        await coordinator.async_refresh()
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Handle removal of an entry."""
-    if unloaded := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        _coordinator: ZagonelDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    _coordinator: ZagonelDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    if unloaded := await hass.config_entries.async_unload_platforms(entry, _coordinator.platforms):
         _coordinator.release()
         hass.data[DOMAIN].pop(entry.entry_id)
+        # Write what is still delayed, or a reload would read stale data
+        await _coordinator.async_save_cache()
     return unloaded
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the chars cache and session totals of a deleted entry."""
+    device_id = entry.data[CONF_DEVICE_ID]
+    await Store(hass, STORAGE_VERSION, storage_key(device_id)).async_remove()
+    await Store(hass, STORAGE_VERSION, session_storage_key(device_id)).async_remove()
+
+
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Reload config entry."""
     await async_unload_entry(hass, entry)
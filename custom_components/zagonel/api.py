@@ -1,16 +1,32 @@
 """Sample API Client."""
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
-from dataclasses import asdict, dataclass
+import string
+import sys
+import time
+from collections import deque
+from collections.abc import Callable, Iterable
+from dataclasses import asdict, dataclass, field, fields
 from enum import Enum, IntEnum
-from typing import Any, Literal
+from typing import TYPE_CHECKING, Any, ClassVar, Literal
 
-import paho.mqtt.client as mqtt
-from dacite import Config, from_dict
+from custom_components.zagonel.zagonel_future import ZagonelPendingRequests
 
-from custom_components.zagonel.zagonel_future import ZagonelFuture
+from .const import DEAD_LETTER_SIZE, MALFORMED_LOG_INTERVAL
+from .metrics import ZagonelMetrics
+
+if TYPE_CHECKING:
+    import paho.mqtt.client as mqtt
+
+    from .hub import ZagonelMqttHub
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -64,28 +80,96 @@ class ZagonelRGBMode(ZagonelEnum):
     FIXED = 2
 
 
-@dataclass
+MESSAGE_TYPES = ("Chars", "Status")
+HEX_DIGITS = frozenset(string.hexdigits)
+
+
+def _number(value: Any) -> int | float:
+    """Validate a number."""
+    if isinstance(value, bool) or not isinstance(value, int | float):
+        raise TypeError(f"Expected a number, got {value!r}")
+    return value
+
+
+def _string(value: Any) -> str:
+    """Validate a string."""
+    if not isinstance(value, str):
+        raise TypeError(f"Expected a string, got {value!r}")
+    return value
+
+
+def _color(value: Any) -> str:
+    """Validate a #RRGGBB color, sharing one copy of each."""
+    if not isinstance(value, str) or len(value) != 7 or value[0] != "#" or not HEX_DIGITS.issuperset(value[1:]):
+        raise ValueError(f"Expected a #RRGGBB color, got {value!r}")
+    return sys.intern(value)
+
+
+# Converters of the fields without their own, by annotation
+TYPE_CONVERTERS: dict[str, Callable[[Any], Any]] = {
+    "int | None": _number,
+    "str | None": _string,
+}
+
+FIELD_CONVERTERS: dict[str, Callable[[Any], Any]] = {
+    "Control_Mode": ZagonelControlMode,
+    "Rgb_Mode": ZagonelRGBMode,
+    "Parental_Mode": ZagonelParentalMode,
+    # Strings most devices share, one copy for all of them instead of one
+    # per device and message
+    "Type": sys.intern,
+    "St": sys.intern,
+    "Rgb_Color": _color,
+    "Hw_Version": sys.intern,
+    "Fw_Version": sys.intern,
+    "Fw_Timestamp": sys.intern,
+}
+
+
+def compile_fields(cls):
+    """Precompute the converter of every field of a ZagonelBase dataclass."""
+    cls.converters = {
+        _field.name: FIELD_CONVERTERS.get(_field.name) or TYPE_CONVERTERS.get(_field.type)
+        for _field in fields(cls)
+    }
+    return cls
+
+
+@dataclass(slots=True)
 class ZagonelBase:
     """ZagonelBase."""
 
-    def update(self, data: dict):
-        """Update."""
+    converters: ClassVar[dict[str, Callable[[Any], Any] | None]] = {}
+
+    def update(self, data: dict) -> set[str]:
+        """Update, returning the fields whose value changed.
+
+        Every value is converted before any is set, so a value that doesn't
+        fit its field raises ValueError or TypeError and changes nothing.
+        """
+        converters = self.converters
+        values = {}
         for key, value in data.items():
-            if hasattr(self, key):
-                if key == "Control_Mode":
-                    setattr(self, key, ZagonelControlMode(value))
-                elif key == "Rgb_Mode":
-                    setattr(self, key, ZagonelRGBMode(value))
-                elif key == "Parental_Mode":
-                    setattr(self, key, ZagonelParentalMode(value))
-                else:
-                    setattr(self, key, value)
+            if key not in converters:
+                continue
+            converter = converters[key]
+            if converter is not None and value is not None:
+                value = converter(value)
+            values[key] = value
+        changed = set()
+        for key, value in values.items():
+            if getattr(self, key) != value:
+                setattr(self, key, value)
+                changed.add(key)
+        return changed
 
     @classmethod
     def from_dict(cls, data: dict[str, Any]):
         """from_dict."""
         if isinstance(data, dict):
-            return from_dict(cls, data, config=Config(cast=[Enum]))
+            instance = cls()
+            instance.update(data)
+            return instance
 
     def as_dict(self) -> dict:
         """as_dict."""
@@ -99,7 +183,8 @@ class ZagonelBase:
         )
 
 
-@dataclass
+@compile_fields
+@dataclass(slots=True)
 class ZagonelChars(ZagonelBase):
     """ZagonelChars."""
 
@@ -123,7 +208,8 @@ class ZagonelChars(ZagonelBase):
     Wifi_SSID: str | None = None
 
 
-@dataclass
+@compile_fields
+@dataclass(slots=True)
 class ZagonelStatus(ZagonelBase):
     """ZagonelStatus."""
 
@@ -143,12 +229,14 @@ class ZagonelStatus(ZagonelBase):
     Wi: int | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ZagonelData(ZagonelBase):
     """ZagonelData."""
 
     chars: ZagonelChars | None = None
     status: ZagonelStatus | None = None
+    # Fields changed since listeners were last notified
+    changed: set[str] = field(default_factory=set)
 
 
 class ZagonelApiClient:
@@ -156,74 +244,254 @@ class ZagonelApiClient:
 
     def __init__(
             self,
-            device_id: str
+            device_id: str,
+            hub: ZagonelMqttHub,
     ) -> None:
         """Sample API Client."""
         self._device_id = device_id
-        self._client = mqtt.Client(transport="websockets")
+        self._hub = hub
+        self._unsubscribe: Callable[[], None] | None = None
         self.data: ZagonelData | None = None
-        self.waiting_queue: list[ZagonelFuture] = []
-
-    def on_connect(self, _userdata=None, _flags_dict=None, _reason=None, _properties=None):
-        """on_connect."""
-        _LOGGER.debug("Connected to mqtt")
-        (info, _) = self._client.subscribe(f"{self._device_id}_SA")
-        if info != mqtt.MQTT_ERR_SUCCESS:
-            raise ZagonelApiClientError(f"Failed to subscribe ({mqtt.error_string(info)})")
-        _LOGGER.debug(f"Subscribed to {self._device_id}_SA")
-
-    def on_message(self, _client=None, _userdata=None, message: mqtt.MQTTMessage = None):
-        """on_message."""
-        payload: dict = json.loads(message.payload)
-        _LOGGER.debug(f"Got message {payload}")
-        if payload.get("Type") == "Chars":
-            if not self.data:
-                chars = ZagonelChars.from_dict(payload)
-                self.data = ZagonelData(chars=chars)
-            elif not self.data.chars:
-                self.data.chars = ZagonelChars.from_dict(payload)
-            else:
-                self.data.chars.update(payload)
-        elif payload.get("Type") == "Status":
-            if not self.data:
-                status = ZagonelStatus.from_dict(payload)
-                self.data = ZagonelData(status=status)
-            elif not self.data.status:
-                self.data.status = ZagonelStatus.from_dict(payload)
+        self.pending_requests = ZagonelPendingRequests()
+        self._listeners: list[Callable[[], None]] = []
+        # Fields written optimistically, mapped to their value before the write
+        # and the value written
+        self.unconfirmed: dict[str, tuple[Any, Any]] = {}
+        self.metrics = ZagonelMetrics()
+        # Latest messages set aside, and malformed ones not warned about yet
+        self.dead_letters: deque[dict[str, Any]] = deque(maxlen=DEAD_LETTER_SIZE)
+        # time.monotonic() of the last message from the device, None until one
+        self.last_seen: float | None = None
+        self._unreported = 0
+        self._last_warning = -MALFORMED_LOG_INTERVAL
+
+    @property
+    def device_id(self) -> str:
+        """Device id."""
+        return self._device_id
+
+    @property
+    def hub(self) -> ZagonelMqttHub:
+        """Shared connection of the device."""
+        return self._hub
+
+    def restore_chars(self, chars: dict[str, Any]):
+        """Seed chars with values cached from an earlier session."""
+        if not self.data:
+            self.data = ZagonelData()
+        if not self.data.chars:
+            self.data.chars = ZagonelChars.from_dict(chars)
+
+    def add_listener(self, update_callback: Callable[[], None]) -> Callable[[], None]:
+        """Listen for unsolicited messages pushed by the device."""
+        self._listeners.append(update_callback)
+
+        def remove_listener() -> None:
+            """Remove update listener."""
+            if update_callback in self._listeners:
+                self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    def on_message(self, message: mqtt.MQTTMessage):
+        """Decode and apply a message, setting aside the ones that don't fit."""
+        self.last_seen = time.monotonic()
+        self.metrics.messages.mark()
+        start = time.perf_counter()
+        try:
+            payload = json_loads(message.payload)
+        except ValueError as exception:
+            self._reject("invalid_json", message.payload, exception)
+            return
+        _LOGGER.debug("Got message %s", payload)
+        if not isinstance(payload, dict) or payload.get("Type") not in MESSAGE_TYPES:
+            self._reject("unknown_type", payload)
+            return
+        self._handle_payload(payload, start)
+
+    def _reject(self, reason: str, payload: Any, error: Exception | None = None):
+        """Count and keep a message that can't be applied, warning now and then."""
+        self.metrics.observe_rejected(reason)
+        if isinstance(payload, bytes):
+            payload = payload[:512].decode(errors="replace")
+        self.dead_letters.append({
+            "time": time.time(),
+            "reason": reason,
+            "error": str(error) if error else None,
+            "payload": payload,
+        })
+        self._unreported += 1
+        now = time.monotonic()
+        if now - self._last_warning >= MALFORMED_LOG_INTERVAL:
+            _LOGGER.warning(
+                "Set aside %s malformed messages from %s, the latest for %s",
+                self._unreported,
+                self._device_id,
+                reason,
+            )
+            self._unreported = 0
+            self._last_warning = now
+
+    def _handle_payload(self, payload: dict, start: float | None = None) -> None:
+        """Apply a message to data, then resolve requests and notify listeners.
+
+        Only converting the message can set it aside, errors raised by
+        listeners are theirs and propagate. With start, the perf_counter()
+        the message arrived at, the time to parse and convert it is observed
+        once it was applied.
+        """
+        try:
+            reconciled = self._apply(payload)
+        except (TypeError, ValueError) as exception:
+            self._reject("invalid_field", payload, exception)
+            return
+        if start is not None:
+            self.metrics.decode.observe(time.perf_counter() - start)
+        resolved = self._resolve_pending(payload)
+        if (reconciled or not resolved) and payload.get("Type") in MESSAGE_TYPES:
+            self._notify_listeners()
+
+    def _apply(self, payload: dict) -> bool:
+        """Convert a message into data, return if it confirmed optimistic fields.
+
+        A value that doesn't fit its field raises ValueError or TypeError
+        and changes nothing.
+        """
+        message_type = payload.get("Type")
+        # Objects are only attached once their first message was valid, an
+        # empty one would count as loaded
+        data = self.data or ZagonelData()
+        changed: set[str] = set()
+        reconciled = False
+        if message_type == "Chars":
+            chars = data.chars or ZagonelChars()
+            changed = chars.update(self._unheld(payload))
+            data.chars = chars
+            reconciled = self._reconcile(payload)
+        elif message_type == "Status":
+            status = data.status or ZagonelStatus()
+            changed = status.update(payload)
+            data.status = status
+        self.data = data
+        if changed:
+            self.data.changed |= changed
+        return reconciled
+
+    def _notify_listeners(self):
+        """Notify listeners that data changed."""
+        for update_callback in list(self._listeners):
+            update_callback()
+
+    def apply_optimistic(self, values: dict[str, Any]) -> bool:
+        """Apply written values to chars before the device confirms them.
+
+        Listeners aren't notified, nothing was heard from the device. Return
+        if any value was applied.
+        """
+        if not self.data or not self.data.chars:
+            return False
+        values = {key: value for key, value in values.items() if hasattr(self.data.chars, key)}
+        if not values:
+            return False
+        for key, value in values.items():
+            previous = self.unconfirmed[key][0] if key in self.unconfirmed else getattr(self.data.chars, key)
+            self.unconfirmed[key] = (previous, value)
+        self.data.changed |= self.data.chars.update(values)
+        return True
+
+    def rollback_optimistic(self, keys: Iterable[str]) -> bool:
+        """Restore the values that optimistic writes replaced, return if any was."""
+        previous = {key: self.unconfirmed.pop(key)[0] for key in keys if key in self.unconfirmed}
+        if not previous or not self.data or not self.data.chars:
+            return False
+        for key, value in previous.items():
+            if value is None:
+                setattr(self.data.chars, key, None)
+                self.data.changed.add(key)
             else:
-                self.data.status.update(payload)
-        if len(self.waiting_queue) > 0:
-            fut = self.waiting_queue.pop()
-            fut.resolve(True)
+                self.data.changed |= self.data.chars.update({key: value})
+        return True
+
+    def _unheld(self, payload: dict) -> dict:
+        """Drop the optimistic fields a Chars message doesn't echo yet.
+
+        A Chars sent before a write carries the old value, applying it would
+        flip the field back until the write's own echo.
+        """
+        if not self.unconfirmed:
+            return payload
+        return {
+            key: value
+            for key, value in payload.items()
+            if key not in self.unconfirmed or value == self.unconfirmed[key][1]
+        }
+
+    def _reconcile(self, payload: dict) -> bool:
+        """Confirm optimistic fields a Chars message echoes with the value written."""
+        confirmed = [
+            key for key, (_previous, written) in self.unconfirmed.items()
+            if key in payload and payload[key] == written
+        ]
+        for key in confirmed:
+            del self.unconfirmed[key]
+        return bool(confirmed)
+
+    @staticmethod
+    def _reply_key(payload: dict) -> tuple[str, ...]:
+        """Key of the reply expected for a command."""
+        command = payload["command"]
+        if command == "getStatus":
+            return ("Status",)
+        if command == "getChars":
+            return ("Chars",)
+        # Setters are acknowledged by a Chars message echoing the field with
+        # the value written, every Chars carries every field
+        return ("Chars", command)
+
+    def _resolve_pending(self, payload: dict) -> bool:
+        """Resolve requests waiting for this message, return if any was."""
+        message_type = payload.get("Type")
+        resolved = self.pending_requests.resolve((message_type,), payload)
+        if message_type == "Chars":
+            for key, value in payload.items():
+                if self.pending_requests.resolve((message_type, key), payload, value):
+                    resolved = True
+        return resolved
 
     def is_connected(self):
         """is_connected."""
-        return self._client.is_connected()
+        return self._hub.is_connected()
 
     async def connect(self):
         """connect."""
-        if not self.is_connected():
-            self._client.on_connect = self.on_connect
-            self._client.on_message = self.on_message
-            _LOGGER.debug("Connecting to mqtt")
-            self._client.connect(host="smartbanho.zagonel.com.br", port=58083)
-            self._client.loop_start()
+        if not self._unsubscribe:
+            self._unsubscribe = self._hub.subscribe(f"{self._device_id}_SA", self.on_message)
+        await self._hub.async_connect()
+
+    def release(self):
+        """Stop receiving messages, releasing the shared connection if unused."""
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
 
-    async def send_command(self, payload: dict):
+    async def send_command(self, payload: dict, timeout: float = 5):
         """send_command."""
         command = payload["command"]
         if self.is_running() and command == "getChars":
             raise ZagonelApiClientError("Can't send commands while device is running")
-        info = self._client.publish(f"{self._device_id}_AS", json.dumps(payload))
-        if info.rc != mqtt.MQTT_ERR_SUCCESS:
-            raise ZagonelApiClientError(f"Failed to publish ({mqtt.error_string(info.rc)})")
-        _LOGGER.debug(f"Sent message {payload}")
+        key = self._reply_key(payload)
+        fut = self.pending_requests.add(key, payload.get("value"))
         try:
-            fut = ZagonelFuture()
-            self.waiting_queue.append(fut)
-            await fut.async_get(5)
-        except TimeoutError as exception:
-            raise ZagonelApiClientError(exception) from exception
+            await self._hub.async_publish(f"{self._device_id}_AS", json.dumps(payload))
+            _LOGGER.debug("Sent message %s", payload)
+            sent = time.monotonic()
+            await fut.async_get(timeout)
+            self.metrics.observe_reply(command, time.monotonic() - sent)
+        except asyncio.TimeoutError as exception:
+            self.metrics.observe_timeout(command)
+            raise ZagonelApiClientError(f"Timed out waiting for {command} reply") from exception
+        finally:
+            self.pending_requests.discard(key, fut)
 
     def is_running(self):
         """Check if device is running."""
@@ -231,18 +499,22 @@ class ZagonelApiClient:
 
     async def async_load_data(self):
         """Get data from the API."""
+        await self.connect()
         if not self.is_connected():
-            await self.connect()
+            # The hub is reconnecting, don't let polls pile up behind commands
+            raise ZagonelApiClientCommunicationError("Waiting for the mqtt connection to come back")
         try:
             await self.send_command({"command": "getStatus"})
         except ZagonelApiClientError as e:
-            if not self.data.status:
+            if not self.data or not self.data.status:
                 raise e
             _LOGGER.warning(e)
         if not self.is_running():
             try:
                 await self.send_command({"command": "getChars"})
             except ZagonelApiClientError as e:
-                if not self.data.chars:
+                if not self.data or not self.data.chars:
                     raise e
                 _LOGGER.warning(e)
+        elif not self.data.chars:
+            raise ZagonelApiClientError("Can't load device characteristics while device is running")
@@ -10,12 +10,16 @@ from homeassistant.components.climate import (
     HVACMode,
 )
 from homeassistant.const import ATTR_TEMPERATURE, UnitOfTemperature
+from homeassistant.core import callback
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.util import slugify
 
 from .const import DOMAIN
 from .coordinator import ZagonelDataUpdateCoordinator
-from .entity import ZagonelEntity
+from .entity import ZagonelEntity, data_keys
+
+# Chars field holding the temperature of each preset mode
+PRESET_FIELDS = {f"preset_{index}": f"Preset_{index}" for index in range(1, 5)}
 
 ENTITY_DESCRIPTIONS = (
     ClimateEntityDescription(
@@ -44,6 +48,7 @@ async def async_setup_entry(hass, entry, async_add_devices):
 class ZagonelClimate(ZagonelEntity, ClimateEntity):
     """Zagonel Climate class."""
 
+    _data_keys = data_keys("St", "To", "Preset_1", "Preset_2", "Preset_3", "Preset_4")
     _attr_supported_features = ClimateEntityFeature.TARGET_TEMPERATURE | ClimateEntityFeature.PRESET_MODE
     _attr_target_temperature_step = 1
     _attr_hvac_modes = [HVACMode.OFF, HVACMode.HEAT]
@@ -51,7 +56,7 @@ class ZagonelClimate(ZagonelEntity, ClimateEntity):
     _attr_min_temp = 25
     _attr_max_temp = 50
     _attr_preset_mode = "preset_1"
-    _attr_preset_modes = ["preset_1", "preset_2", "preset_3", "preset_4"]
+    _attr_preset_modes = list(PRESET_FIELDS)
 
     def __init__(
             self,
@@ -63,29 +68,33 @@ class ZagonelClimate(ZagonelEntity, ClimateEntity):
         super().__init__(unique_id, coordinator)
         self.entity_description = entity_description
 
-    @property
-    def hvac_mode(self) -> HVACMode | None:
-        """Return the current HVAC mode."""
-        return HVACMode.HEAT if self.coordinator.client.is_running() else HVACMode.OFF
-
-    @property
-    def current_temperature(self) -> float | None:
-        """Return the current temperature."""
-        return math.floor(self.coordinator.data.status.To / 1000)
+    @callback
+    def _update_attrs(self) -> None:
+        """Compute the mode and temperatures."""
+        self._attr_hvac_mode = HVACMode.HEAT if self.coordinator.client.is_running() else HVACMode.OFF
+        status = self.coordinator.data.status
+        if status is None or status.To is None:
+            self._attr_current_temperature = None
+        else:
+            self._attr_current_temperature = math.floor(status.To / 1000)
+        target = getattr(self.coordinator.data.chars, self._preset_field)
+        self._attr_target_temperature = None if target is None else math.floor(target / 1000)
 
     @property
-    def target_temperature(self) -> float | None:
-        """Return the temperature we try to reach."""
-        return math.floor(getattr(self.coordinator.data.chars, self.preset_mode.capitalize()) / 1000)
+    def _preset_field(self) -> str:
+        """Chars field of the preset in use."""
+        return PRESET_FIELDS[self._attr_preset_mode]
 
-    def set_preset_mode(self, preset_mode: str) -> None:
+    async def async_set_preset_mode(self, preset_mode: str) -> None:
         """Set new preset mode."""
         self._attr_preset_mode = preset_mode
+        self._update_attrs()
+        self.async_write_ha_state()
 
     async def async_set_temperature(self, **kwargs) -> None:
         """async_set_temperature."""
         temperature = kwargs[ATTR_TEMPERATURE]
-        await self.send(self.preset_mode.capitalize(), math.floor(temperature * 1000))
+        await self.send(self._preset_field, math.floor(temperature * 1000))
 
     async def async_set_hvac_mode(self, hvac_mode: HVACMode) -> None:
         """async_set_hvac_mode."""
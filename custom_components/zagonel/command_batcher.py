@@ -0,0 +1,109 @@
+"""Class to coalesce commands."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from .api import ZagonelApiClientError
+
+
+class ZagonelCommandBatcher:
+    """Merge commands issued within a short window, the last value wins."""
+
+    def __init__(
+            self,
+            send: Callable[[dict], Awaitable[Any]],
+            after_flush: Callable[[bool], Awaitable[Any]] | None = None,
+            window: float = 0.3,
+    ):
+        """Init batcher."""
+        self._send = send
+        self._after_flush = after_flush
+        self._window = window
+        self._values: dict[str, Any] = {}
+        self._batch: asyncio.Future | None = None
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flush_tasks: set[asyncio.Task] = set()
+        # Batches being sent, their callers wait until they are done
+        self._flushing: set[asyncio.Future] = set()
+
+    async def async_write(self, command: str, value: Any | None = None) -> None:
+        """Queue a single command and wait until its batch was sent."""
+        await self.async_write_many({command: value})
+
+    async def async_write_many(self, values: dict[str, Any], immediate: bool = False) -> None:
+        """Queue commands and wait until their batch was sent.
+
+        With immediate the batch is sent right away instead of waiting for
+        more commands, for callers that already hold every value.
+        """
+        for command, value in values.items():
+            # Re-insert so the command is sent in the order it was last written
+            self._values.pop(command, None)
+            self._values[command] = value
+        if self._batch is None:
+            loop = asyncio.get_running_loop()
+            self._batch = loop.create_future()
+            self._flush_handle = loop.call_later(self._window, self._flush)
+        batch = self._batch
+        if immediate:
+            self._flush_handle.cancel()
+            self._flush()
+        await asyncio.shield(batch)
+
+    def _flush(self) -> None:
+        """Send the current batch."""
+        values, batch = self._values, self._batch
+        self._values, self._batch, self._flush_handle = {}, None, None
+        self._flushing.add(batch)
+        task = asyncio.get_running_loop().create_task(self._async_flush(values, batch))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _async_flush(self, values: dict[str, Any], batch: asyncio.Future) -> None:
+        """Send every command of a batch, then run a single after flush.
+
+        The after flush is told if any command of the batch failed.
+        """
+        try:
+            results = await asyncio.gather(
+                *(self._send(self._payload(command, value)) for command, value in values.items()),
+                return_exceptions=True,
+            )
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if self._after_flush:
+                await self._after_flush(bool(errors))
+        finally:
+            self._flushing.discard(batch)
+        if batch.done():
+            return
+        if errors:
+            batch.set_exception(errors[0])
+        else:
+            batch.set_result(None)
+
+    @staticmethod
+    def _payload(command: str, value: Any | None) -> dict:
+        """Build the payload of a command."""
+        payload = {
+            "command": command
+        }
+        if value is not None:
+            payload["value"] = value
+        return payload
+
+    def release(self) -> None:
+        """Drop queued commands and cancel flushes in progress, failing their batches."""
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._batch:
+            self._flushing.add(self._batch)
+        for batch in self._flushing:
+            if not batch.done():
+                batch.set_exception(ZagonelApiClientError("Commands dropped, the device was unloaded"))
+        self._values, self._batch = {}, None
+        self._flushing.clear()
+        for task in self._flush_tasks:
+            task.cancel()
@@ -1,17 +1,48 @@
 """Adds config flow for Zagonel."""
 from __future__ import annotations
 
+import importlib
+from collections.abc import Mapping
+from typing import Any
+
 import voluptuous as vol
 from homeassistant import config_entries
+from homeassistant.const import CONF_HOST, CONF_PORT, Platform
+from homeassistant.core import callback
 from homeassistant.helpers import selector
 
+from . import PLATFORMS, async_import_hub
 from .api import (
     ZagonelApiClient,
     ZagonelApiClientAuthenticationError,
     ZagonelApiClientCommunicationError,
     ZagonelApiClientError,
 )
-from .const import CONF_DEVICE_ID, DOMAIN, LOGGER
+from .const import (
+    CONF_DEADBAND,
+    CONF_DEVICE_ID,
+    CONF_IDLE_INTERVAL,
+    CONF_MAX_BACKOFF,
+    CONF_MIN_INTERVAL,
+    CONF_PLATFORMS,
+    CONF_REFRESH_WINDOW,
+    CONF_RUNNING_INTERVAL,
+    CONF_STALE_AFTER,
+    CONF_TLS,
+    CONF_TRANSPORT,
+    DEFAULT_IDLE_INTERVAL,
+    DEFAULT_MAX_BACKOFF,
+    DEFAULT_REFRESH_WINDOW,
+    DEFAULT_RUNNING_INTERVAL,
+    DEFAULT_STALE_AFTER,
+    DEFAULT_TRANSPORT,
+    DOMAIN,
+    LOGGER,
+    MQTT_HOST,
+    MQTT_PORT,
+    TRANSPORT_TCP,
+    TRANSPORT_WEBSOCKETS,
+)
 
 
 class ZagonelFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
@@ -19,6 +50,14 @@ class ZagonelFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> config_entries.OptionsFlow:
+        """Get the options flow for this handler."""
+        return ZagonelOptionsFlowHandler(config_entry)
+
     async def async_step_user(
         self,
         user_input: dict | None = None,
@@ -28,7 +67,8 @@ class ZagonelFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         if user_input is not None:
             try:
                 await self._test_credentials(
-                    device_id=user_input[CONF_DEVICE_ID]
+                    device_id=user_input[CONF_DEVICE_ID],
+                    broker=user_input,
                 )
             except ZagonelApiClientAuthenticationError as exception:
                 LOGGER.warning(exception)
@@ -57,14 +97,165 @@ class ZagonelFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
                             type=selector.TextSelectorType.TEXT
                         ),
                     ),
+                    **_broker_schema(user_input or {}),
                 }
             ),
             errors=_errors,
         )
 
-    async def _test_credentials(self, device_id: str) -> None:
+    async def _test_credentials(self, device_id: str, broker: Mapping[str, Any]) -> None:
         """Validate credentials."""
         client = ZagonelApiClient(
             device_id=device_id,
+            hub=(await async_import_hub(self.hass)).async_get_hub(self.hass, broker),
         )
-        await client.async_load_data()
+        try:
+            await client.async_load_data()
+        finally:
+            client.release()
+
+
+def _broker_schema(defaults: Mapping[str, Any]) -> dict:
+    """Build the schema of the broker settings."""
+    return {
+        vol.Required(
+            CONF_HOST,
+            default=defaults.get(CONF_HOST, MQTT_HOST),
+        ): selector.TextSelector(
+            selector.TextSelectorConfig(
+                type=selector.TextSelectorType.TEXT
+            ),
+        ),
+        vol.Required(
+            CONF_PORT,
+            default=defaults.get(CONF_PORT, MQTT_PORT),
+        ): vol.All(
+            selector.NumberSelector(
+                selector.NumberSelectorConfig(
+                    min=1,
+                    max=65535,
+                    mode=selector.NumberSelectorMode.BOX,
+                ),
+            ),
+            vol.Coerce(int),
+        ),
+        vol.Required(
+            CONF_TRANSPORT,
+            default=defaults.get(CONF_TRANSPORT, DEFAULT_TRANSPORT),
+        ): selector.SelectSelector(
+            selector.SelectSelectorConfig(
+                options=[TRANSPORT_WEBSOCKETS, TRANSPORT_TCP],
+                translation_key=CONF_TRANSPORT,
+            ),
+        ),
+        vol.Required(
+            CONF_TLS,
+            default=defaults.get(CONF_TLS, False),
+        ): selector.BooleanSelector(),
+    }
+
+
+def _seconds_selector(minimum: int, maximum: int) -> selector.NumberSelector:
+    """Build a number selector for an interval in seconds."""
+    return selector.NumberSelector(
+        selector.NumberSelectorConfig(
+            min=minimum,
+            max=maximum,
+            step=1,
+            unit_of_measurement="s",
+            mode=selector.NumberSelectorMode.BOX,
+        ),
+    )
+
+
+class ZagonelOptionsFlowHandler(config_entries.OptionsFlow):
+    """Options flow for Zagonel."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        """Initialize options flow."""
+        self.config_entry = config_entry
+        self._options: dict[str, Any] = {}
+
+    async def async_step_init(
+        self,
+        user_input: dict | None = None,
+    ) -> config_entries.FlowResult:
+        """Manage the options."""
+        if user_input is not None:
+            self._options.update(user_input)
+            if Platform.SENSOR not in user_input[CONF_PLATFORMS]:
+                return self.async_create_entry(title="", data=self._options)
+            return await self.async_step_sensors()
+
+        options = self.config_entry.options
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    **_broker_schema({**self.config_entry.data, **options}),
+                    vol.Required(
+                        CONF_RUNNING_INTERVAL,
+                        default=options.get(CONF_RUNNING_INTERVAL, DEFAULT_RUNNING_INTERVAL.total_seconds()),
+                    ): _seconds_selector(1, 300),
+                    vol.Required(
+                        CONF_IDLE_INTERVAL,
+                        default=options.get(CONF_IDLE_INTERVAL, DEFAULT_IDLE_INTERVAL.total_seconds()),
+                    ): _seconds_selector(10, 3600),
+                    vol.Required(
+                        CONF_MAX_BACKOFF,
+                        default=options.get(CONF_MAX_BACKOFF, DEFAULT_MAX_BACKOFF.total_seconds()),
+                    ): _seconds_selector(10, 86400),
+                    vol.Required(
+                        CONF_REFRESH_WINDOW,
+                        default=options.get(CONF_REFRESH_WINDOW, DEFAULT_REFRESH_WINDOW),
+                    ): _seconds_selector(0, 30),
+                    vol.Required(
+                        CONF_STALE_AFTER,
+                        default=options.get(CONF_STALE_AFTER, DEFAULT_STALE_AFTER.total_seconds()),
+                    ): _seconds_selector(0, 86400),
+                    vol.Required(
+                        CONF_PLATFORMS,
+                        default=options.get(CONF_PLATFORMS, list(PLATFORMS)),
+                    ): selector.SelectSelector(
+                        selector.SelectSelectorConfig(
+                            options=list(PLATFORMS),
+                            multiple=True,
+                            translation_key=CONF_PLATFORMS,
+                        ),
+                    ),
+                }
+            ),
+        )
+
+    async def async_step_sensors(
+        self,
+        user_input: dict | None = None,
+    ) -> config_entries.FlowResult:
+        """Manage the deadband and minimum interval of the noisy sensors."""
+        if user_input is not None:
+            self._options.update(user_input)
+            return self.async_create_entry(title="", data=self._options)
+
+        # Only loaded here, the sensor component may not be in use otherwise
+        sensor = await self.hass.async_add_executor_job(importlib.import_module, f"{__package__}.sensor")
+        options = self.config_entry.options
+        schema = {}
+        for entity_description in sensor.FILTERED_ENTITY_DESCRIPTIONS:
+            deadband = f"{entity_description.key}_{CONF_DEADBAND}"
+            min_interval = f"{entity_description.key}_{CONF_MIN_INTERVAL}"
+            schema[vol.Required(
+                deadband,
+                default=options.get(deadband, entity_description.deadband),
+            )] = selector.NumberSelector(
+                selector.NumberSelectorConfig(
+                    min=0,
+                    step="any",
+                    unit_of_measurement=entity_description.native_unit_of_measurement,
+                    mode=selector.NumberSelectorMode.BOX,
+                ),
+            )
+            schema[vol.Required(
+                min_interval,
+                default=options.get(min_interval, entity_description.min_interval),
+            )] = _seconds_selector(0, 3600)
+        return self.async_show_form(step_id="sensors", data_schema=vol.Schema(schema))
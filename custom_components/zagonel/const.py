@@ -1,4 +1,5 @@
 """Constants for zagonel."""
+from datetime import timedelta
 from logging import Logger, getLogger
 
 LOGGER: Logger = getLogger(__package__)
@@ -9,3 +10,83 @@ VERSION = "0.0.0"
 ATTRIBUTION = "Data provided by https://zagonel.com.br"
 
 CONF_DEVICE_ID = "device_id"
+
+# Broker, the Zagonel cloud unless a local broker is configured
+CONF_TRANSPORT = "transport"
+CONF_TLS = "tls"
+MQTT_HOST = "smartbanho.zagonel.com.br"
+MQTT_PORT = 58083
+TRANSPORT_TCP = "tcp"
+TRANSPORT_WEBSOCKETS = "websockets"
+DEFAULT_TRANSPORT = TRANSPORT_WEBSOCKETS
+
+# Platforms set up for an entry, every one unless narrowed in the options
+CONF_PLATFORMS = "platforms"
+# Registry option of the entities disabled because their platform was left out
+OPTION_PLATFORM_LEFT_OUT = "platform_left_out"
+
+# Last known Chars of each device, so entities can be set up without waiting
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10
+
+# Status samples kept per device, about 17 minutes at one per second
+HISTORY_SIZE = 1024
+
+SERVICE_GET_HISTORY = "get_history"
+ATTR_MINUTES = "minutes"
+
+# Writes the same chars to many devices, this many at once by default
+SERVICE_SET_VALUES = "set_values"
+ATTR_VALUES = "values"
+ATTR_MAX_PARALLEL = "max_parallel"
+DEFAULT_MAX_PARALLEL = 10
+
+# Malformed messages kept for diagnostics, and seconds between warnings
+DEAD_LETTER_SIZE = 20
+MALFORMED_LOG_INTERVAL = 60.0
+
+# Fired with the summary of each shower when it ends
+EVENT_SESSION_ENDED = f"{DOMAIN}_session_ended"
+
+# Key of the shared MQTT connections in hass.data[DOMAIN], one per broker
+DATA_HUBS = "hubs"
+
+# Reconnect delays, doubled after each failed attempt and jittered
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+# Commands held while the connection is down, and seconds they may wait
+OUTBOX_SIZE = 100
+OUTBOX_MAX_AGE = 30.0
+
+# First refreshes running at once, and seconds between their first requests
+STARTUP_CONCURRENCY = 10
+STARTUP_STAGGER = 0.05
+
+# Push mode: the device reports every change on its own, so only poll after
+# this long without hearing from it, sooner while the shower is running.
+CONF_RUNNING_INTERVAL = "running_interval"
+CONF_IDLE_INTERVAL = "idle_interval"
+CONF_MAX_BACKOFF = "max_backoff"
+DEFAULT_RUNNING_INTERVAL = timedelta(seconds=5)
+DEFAULT_IDLE_INTERVAL = timedelta(minutes=5)
+DEFAULT_MAX_BACKOFF = timedelta(minutes=15)
+
+# Entities become unavailable after hearing nothing from the device for
+# this long, polls included, 0 to never. It is raised to two idle polls so
+# a quiet idle shower isn't marked. A dead broker connection, noticed by
+# the hub's mqtt keepalive, makes them unavailable right away instead.
+CONF_STALE_AFTER = "stale_after"
+DEFAULT_STALE_AFTER = timedelta(minutes=15)
+
+# Refresh requests made within this many seconds are merged into one.
+CONF_REFRESH_WINDOW = "refresh_window"
+DEFAULT_REFRESH_WINDOW = 1.0
+
+# Noisy status sensors write only when their value moved by the deadband,
+# at most once per minimum interval. Options are per sensor, "Vi_deadband".
+CONF_DEADBAND = "deadband"
+CONF_MIN_INTERVAL = "min_interval"
+
+# Commands written within this many seconds are sent as a single batch.
+COMMAND_BATCH_WINDOW = 0.3
@@ -2,22 +2,50 @@
 from __future__ import annotations
 
 import asyncio
+import time
 from datetime import timedelta
+from functools import cached_property
+from typing import Any
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
     UpdateFailed,
 )
+from homeassistant.util import dt as dt_util
 
 from .api import (
     ZagonelApiClient,
     ZagonelApiClientAuthenticationError,
-    ZagonelApiClientError, ZagonelData,
+    ZagonelApiClientError,
+    ZagonelChars,
+    ZagonelData,
 )
-from .const import DOMAIN, LOGGER
+from .command_batcher import ZagonelCommandBatcher
+from .const import (
+    COMMAND_BATCH_WINDOW,
+    CONF_DEVICE_ID,
+    DEFAULT_IDLE_INTERVAL,
+    DEFAULT_MAX_BACKOFF,
+    DEFAULT_REFRESH_WINDOW,
+    DEFAULT_RUNNING_INTERVAL,
+    DEFAULT_STALE_AFTER,
+    DOMAIN,
+    EVENT_SESSION_ENDED,
+    HISTORY_SIZE,
+    LOGGER,
+    NAME,
+    STORAGE_SAVE_DELAY,
+    STORAGE_VERSION,
+    VERSION,
+)
+from .history import HISTORY_FIELDS, ZagonelStatusHistory
+from .session import SESSION_KEY, ZagonelSessionTracker
 
 
 class ZagonelDataUpdateCoordinator(DataUpdateCoordinator[ZagonelData]):
@@ -29,36 +57,302 @@ class ZagonelDataUpdateCoordinator(DataUpdateCoordinator[ZagonelData]):
             self,
             hass: HomeAssistant,
             client: ZagonelApiClient,
+            running_interval: timedelta = DEFAULT_RUNNING_INTERVAL,
+            idle_interval: timedelta = DEFAULT_IDLE_INTERVAL,
+            max_backoff: timedelta = DEFAULT_MAX_BACKOFF,
+            refresh_window: float = DEFAULT_REFRESH_WINDOW,
+            stale_after: timedelta = DEFAULT_STALE_AFTER,
     ) -> None:
         """Initialize."""
         self.client = client
+        # A quiet idle shower is only heard at each poll, allow it two
+        self.stale_after = max(stale_after, 2 * idle_interval).total_seconds() if stale_after else 0
+        # Whether the device has been silent for stale_after
+        self.stale = False
+        self._watch_started = time.monotonic()
+        self._unsub_stale_check: CALLBACK_TYPE | None = None
+        self.running_interval = running_interval
+        self.idle_interval = idle_interval
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.refresh_window = refresh_window
         super().__init__(
             hass=hass,
             logger=LOGGER,
             name=DOMAIN,
-            update_interval=timedelta(seconds=5),
+            update_interval=idle_interval,
         )
         self.scheduled_refresh: asyncio.TimerHandle | None = None
+        self._refresh_task: asyncio.Task | None = None
+        self._refresh_pending = False
+        # Load in flight, shared by the refreshes started while it runs
+        self._update_task: asyncio.Task | None = None
+        self._store: Store[dict[str, Any]] = Store(hass, STORAGE_VERSION, storage_key(client.device_id))
+        self.history = ZagonelStatusHistory(HISTORY_SIZE)
+        # A running shower is polled every running_interval, missing three
+        # polls means its samples are no longer known
+        self.sessions = ZagonelSessionTracker(max_sample_age=3 * running_interval.total_seconds())
+        self._session_store: Store[dict[str, Any]] = Store(
+            hass, STORAGE_VERSION, session_storage_key(client.device_id)
+        )
+        self.commands = ZagonelCommandBatcher(
+            send=self._async_send_command,
+            after_flush=self._async_after_flush,
+            window=COMMAND_BATCH_WINDOW,
+        )
+        self._remove_push_listener = client.add_listener(self._handle_push)
+        self._remove_reconnect_listener = client.hub.add_reconnect_listener(self._handle_reconnect)
+        self._remove_disconnect_listener = client.hub.add_disconnect_listener(self.async_update_listeners)
+        self._reconnect_refresh: asyncio.Task | None = None
+        # Platforms set up for the entry, unloaded the same even if options changed
+        self.platforms: list[str] = []
+        if self.stale_after:
+            self._schedule_stale_check(self.stale_after)
+
+    @cached_property
+    def device_info(self) -> DeviceInfo:
+        """Device info, built once and shared by every entity of the device."""
+        return DeviceInfo(
+            identifiers={(DOMAIN, self.data.chars.Device_Id)},
+            name=NAME,
+            model=VERSION,
+            manufacturer=NAME,
+        )
+
+    @callback
+    def _handle_push(self) -> None:
+        """Handle data pushed by the device, postponing the liveness poll."""
+        self.failures = 0
+        self._adapt_update_interval()
+        data = self.client.data
+        if "St" in data.changed and not self.client.is_running():
+            # Chars can't be fetched while running, catch up once it stops
+            self.schedule_refresh()
+        self.async_set_updated_data(data)
+
+    @callback
+    def _handle_reconnect(self) -> None:
+        """Catch up on what the device pushed while the connection was down."""
+        # Available again right away, the refresh may wait for a startup slot
+        self.async_update_listeners()
+        if self._reconnect_refresh and not self._reconnect_refresh.done():
+            return
+        self._reconnect_refresh = self.hass.async_create_task(self._async_reconnect_refresh())
+
+    async def _async_reconnect_refresh(self) -> None:
+        """Refresh in a startup slot, so devices don't all poll at once."""
+        async with self.client.hub.startup.async_slot():
+            await self.async_refresh()
+
+    def _adapt_update_interval(self) -> None:
+        """Poll fast while the shower runs, back off when idle or failing."""
+        interval = self.running_interval if self.client.is_running() else self.idle_interval
+        if self.failures:
+            # 2**16 passes any cap, doubling further would overflow timedelta
+            # after hours of failures
+            interval = min(interval * 2 ** min(self.failures, 16), max(self.max_backoff, interval))
+        self.update_interval = interval
+
+    @property
+    def offline(self) -> bool:
+        """Whether the device was silent for too long or the connection is down."""
+        return self.stale or self.client.hub.state == "reconnecting"
+
+    @property
+    def silence(self) -> float:
+        """Seconds since the device was last heard, or since watching it."""
+        return time.monotonic() - (self.client.last_seen or self._watch_started)
+
+    @callback
+    def _schedule_stale_check(self, delay: float) -> None:
+        """Check for silence after delay."""
+        self._unsub_stale_check = async_call_later(self.hass, delay, self._check_stale)
+
+    @callback
+    def _check_stale(self, _now=None) -> None:
+        """Mark the device stale once silent for long enough.
+
+        Messages only move last_seen, the single timer moves itself to the
+        new deadline when it fires, so hearing from the device costs nothing.
+        """
+        self._unsub_stale_check = None
+        silence = self.silence
+        if silence < self.stale_after:
+            self._schedule_stale_check(self.stale_after - silence)
+            return
+        LOGGER.info("Nothing heard from %s for %d s, marking it unavailable", self.client.device_id, silence)
+        self.stale = True
+        self.async_update_listeners()
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Update listeners, then start tracking changes anew."""
+        if self.stale and self.silence < self.stale_after:
+            LOGGER.info("Heard from %s again", self.client.device_id)
+            self.stale = False
+            self._schedule_stale_check(self.stale_after - self.silence)
+        if self.data and self.data.status:
+            if not self.data.changed.isdisjoint(HISTORY_FIELDS):
+                self.history.append(time.time(), self.data.status)
+            self._track_session()
+        super().async_update_listeners()
+        if self.data:
+            if self.data.chars and not self.data.changed.isdisjoint(ZagonelChars.converters):
+                self._store.async_delay_save(self._chars_to_store, STORAGE_SAVE_DELAY)
+            self.data.changed.clear()
+
+    @callback
+    def _track_session(self) -> None:
+        """Feed the status to the session tracker, announcing ended sessions."""
+        data = self.data
+        if self.offline:
+            # Nothing is known while unreachable, the status is the last heard
+            session = self.sessions.interrupt(dt_util.utcnow())
+        elif self.sessions.current is None and not self.client.is_running():
+            return
+        else:
+            session = self.sessions.update(data.status, dt_util.utcnow())
+        if session is None:
+            return
+        data.changed.add(SESSION_KEY)
+        self._session_store.async_delay_save(self.sessions.as_dict, STORAGE_SAVE_DELAY)
+        self.hass.bus.async_fire(
+            EVENT_SESSION_ENDED, {CONF_DEVICE_ID: self.client.device_id, **session.as_dict()}
+        )
 
+    async def async_load_cache(self) -> bool:
+        """Restore chars cached by an earlier session, return if there were any."""
+        if sessions := await self._session_store.async_load():
+            self.sessions.restore(sessions)
+        if not (chars := await self._store.async_load()):
+            return False
+        self.client.restore_chars(chars)
+        self.async_set_updated_data(self.client.data)
+        return True
+
+    async def async_save_cache(self) -> None:
+        """Save chars and session totals now."""
+        if self.data and self.data.chars:
+            await self._store.async_save(self._chars_to_store())
+        if self.sessions.count:
+            await self._session_store.async_save(self.sessions.as_dict())
+
+    @callback
+    def _chars_to_store(self) -> dict[str, Any]:
+        """Chars to cache, as last confirmed by the device."""
+        chars = self.data.chars.as_dict()
+        for key, (previous, _written) in self.client.unconfirmed.items():
+            if previous is None:
+                chars.pop(key, None)
+            else:
+                chars[key] = previous
+        return chars
+
+    @callback
     def schedule_refresh(self) -> None:
-        """Schedule coordinator refresh after 1 second."""
+        """Schedule a refresh, merging requests made within the refresh window."""
         if self.scheduled_refresh:
-            self.scheduled_refresh.cancel()
+            return
         self.scheduled_refresh = self.hass.loop.call_later(
-            1, lambda: asyncio.create_task(self.async_refresh())
+            self.refresh_window, self._start_scheduled_refresh
         )
 
+    @callback
+    def _start_scheduled_refresh(self) -> None:
+        """Start the scheduled refresh, or queue it behind the running one."""
+        self.scheduled_refresh = None
+        self._refresh_pending = True
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        self._refresh_task = self.hass.async_create_task(self._async_scheduled_refresh())
+
+    async def _async_scheduled_refresh(self) -> None:
+        """Refresh until no request is pending."""
+        while self._refresh_pending:
+            self._refresh_pending = False
+            await self.async_refresh()
+
+    async def _async_after_flush(self, failed: bool) -> None:
+        """Refresh once after a batch if a write failed or wasn't echoed.
+
+        A failed write was rolled back already, but the device may have
+        applied it and only its echo got lost.
+        """
+        if failed or self.client.unconfirmed:
+            self.schedule_refresh()
+
+    async def async_write(self, values: dict[str, Any], immediate: bool = False) -> None:
+        """Write values optimistically, the device confirms them later."""
+        # Only entities are updated, the device itself said nothing
+        if self.client.apply_optimistic(values):
+            self.async_update_listeners()
+        await self.commands.async_write_many(values, immediate)
+
+    async def _async_send_command(self, payload: dict) -> None:
+        """Send a batched command, rolling back its optimistic value on failure."""
+        try:
+            await self.client.send_command(payload)
+        except ZagonelApiClientError:
+            if self.client.rollback_optimistic([payload["command"]]):
+                self.async_update_listeners()
+            raise
+
     def release(self) -> None:
         """Disconnect from API."""
+        if self._unsub_stale_check:
+            self._unsub_stale_check()
+            self._unsub_stale_check = None
         if self.scheduled_refresh:
             self.scheduled_refresh.cancel()
+            self.scheduled_refresh = None
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if self._reconnect_refresh:
+            self._reconnect_refresh.cancel()
+            self._reconnect_refresh = None
+        if self._update_task:
+            self._update_task.cancel()
+            self._update_task = None
+        self.commands.release()
+        self._remove_push_listener()
+        self._remove_reconnect_listener()
+        self._remove_disconnect_listener()
+        self.client.release()
 
     async def _async_update_data(self):
         """Update data via library."""
+        if self._update_task is None or self._update_task.done():
+            # Not tracked by itself, whoever refreshes waits for it already
+            self._update_task = self.hass.async_create_background_task(
+                self._async_load_data(), f"{DOMAIN} {self.client.device_id} update"
+            )
+        # Share the load in flight, its result or its error, instead of
+        # sending the same requests again
+        return await asyncio.shield(self._update_task)
+
+    async def _async_load_data(self) -> ZagonelData:
+        """Load data from the device, counting failures."""
         try:
+            start = time.monotonic()
             await self.client.async_load_data()
-            return self.client.data
+            self.client.metrics.refresh.observe(time.monotonic() - start)
         except ZagonelApiClientAuthenticationError as exception:
             raise ConfigEntryAuthFailed(exception) from exception
         except ZagonelApiClientError as exception:
+            self.failures += 1
+            self._adapt_update_interval()
             raise UpdateFailed(exception) from exception
+        self.failures = 0
+        self._adapt_update_interval()
+        return self.client.data
+
+
+def storage_key(device_id: str) -> str:
+    """Key of the chars cache of a device."""
+    return f"{DOMAIN}.chars.{device_id}"
+
+
+def session_storage_key(device_id: str) -> str:
+    """Key of the session totals of a device."""
+    return f"{DOMAIN}.sessions.{device_id}"
@@ -0,0 +1,45 @@
+"""Diagnostics support for zagonel."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_DEVICE_ID, DOMAIN
+from .coordinator import ZagonelDataUpdateCoordinator
+
+TO_REDACT = {CONF_DEVICE_ID, "Device_Id", "User_Id", "Wifi_SSID"}
+
+
+async def async_get_config_entry_diagnostics(
+        hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinator: ZagonelDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    client = coordinator.client
+    data = client.data
+    return {
+        "entry": async_redact_data({"data": dict(entry.data), "options": dict(entry.options)}, TO_REDACT),
+        "data": async_redact_data({
+            "chars": data.chars.as_dict() if data and data.chars else None,
+            "status": data.status.as_dict() if data and data.status else None,
+        }, TO_REDACT),
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "update_interval": coordinator.update_interval.total_seconds(),
+            "failures": coordinator.failures,
+            "unconfirmed": list(client.unconfirmed),
+            "silence": coordinator.silence,
+            "stale": coordinator.stale,
+            "stale_after": coordinator.stale_after,
+        },
+        "metrics": client.metrics.as_dict(),
+        "history": coordinator.history.as_dict(),
+        "dead_letters": async_redact_data(list(client.dead_letters), TO_REDACT),
+        "connection": {
+            "state": client.hub.state,
+            **client.hub.stats.as_dict(),
+        },
+    }
@@ -1,39 +1,77 @@
 """ZagonelEntity class."""
 from __future__ import annotations
 
+from functools import cache
 from typing import Any
 
-from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.core import callback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from .const import ATTRIBUTION, DOMAIN, NAME, VERSION
+from .const import ATTRIBUTION
 from .coordinator import ZagonelDataUpdateCoordinator
 
 
+@cache
+def data_keys(*keys: str) -> frozenset[str]:
+    """Return the set of keys, shared by every entity depending on them."""
+    return frozenset(keys)
+
+
 class ZagonelEntity(CoordinatorEntity[ZagonelDataUpdateCoordinator]):
     """ZagonelEntity class."""
 
     _attr_attribution = ATTRIBUTION
     _attr_has_entity_name = True
+    # Data fields the state depends on, None to write state on every update
+    _data_keys: frozenset[str] | None = None
+    _last_available: bool | None = None
 
     def __init__(self, unique_id: str, coordinator: ZagonelDataUpdateCoordinator) -> None:
         """Initialize."""
         super().__init__(coordinator)
         self._attr_unique_id = unique_id
-        self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, self.coordinator.data.chars.Device_Id)},
-            name=NAME,
-            model=VERSION,
-            manufacturer=NAME,
-        )
+        self._attr_device_info = coordinator.device_info
+
+    @property
+    def available(self) -> bool:
+        """Return if the last refresh succeeded and the device is reachable."""
+        return super().available and not self.coordinator.offline
+
+    async def async_added_to_hass(self) -> None:
+        """Compute the state written when added, remembering its availability."""
+        await super().async_added_to_hass()
+        self._update_attrs()
+        self._last_available = self.available
+
+    @callback
+    def _update_attrs(self) -> None:
+        """Compute the state attributes from the data.
+
+        Runs only when a field in _data_keys changed, so reading the state
+        is a plain attribute lookup however often it happens.
+        """
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write state only when a field this entity depends on changed."""
+        available = self.available
+        data = self.coordinator.data
+        if (
+                self._data_keys is not None
+                and data is not None
+                and available == self._last_available
+                and self._data_keys.isdisjoint(data.changed)
+        ):
+            return
+        self._last_available = available
+        self._update_attrs()
+        super()._handle_coordinator_update()
 
     async def send(self, command: str, value: Any | None = None):
         """send."""
-        payload = {
-            "command": command
-        }
-        if value is not None:
-            payload["value"] = value
-        await self.coordinator.client.send_command(payload)
-        await self.coordinator.async_refresh()
+        await self.coordinator.async_write({command: value})
+
+    async def send_many(self, values: dict[str, Any]):
+        """Send several commands in the same batch."""
+        await self.coordinator.async_write(values)
 
@@ -0,0 +1,74 @@
+"""Recent status samples of a zagonel device."""
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Any
+
+from .api import ZagonelStatus
+
+# Status fields sampled, all below 2**24 so float32 holds them exactly
+HISTORY_FIELDS = ("Pw", "Fl", "To", "Ti", "Vi", "Ts")
+
+
+class ZagonelStatusHistory:
+    """Fixed-size ring buffer of timestamped status samples.
+
+    Samples live in columns, a float64 one for timestamps and a float32 one
+    per field, at 32 bytes per slot. The columns grow until they hold
+    capacity samples, so a quiet device costs little, and recording
+    allocates nothing from then on. Missing values are stored as NaN.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """Initialize."""
+        self.capacity = capacity
+        self._times = array("d")
+        self._columns = {key: array("f") for key in HISTORY_FIELDS}
+        # Slot the next sample goes to, and number of slots in use
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        """Return the number of samples held."""
+        return self._size
+
+    def append(self, timestamp: float, status: ZagonelStatus) -> None:
+        """Record the sampled fields of status, replacing the oldest sample when full."""
+        index = self._next
+        if self._size < self.capacity:
+            # Still growing, the next slot is the end of every column
+            self._times.append(timestamp)
+            for key, column in self._columns.items():
+                value = getattr(status, key)
+                column.append(math.nan if value is None else value)
+            self._size += 1
+        else:
+            self._times[index] = timestamp
+            for key, column in self._columns.items():
+                value = getattr(status, key)
+                column[index] = math.nan if value is None else value
+        self._next = (index + 1) % self.capacity
+
+    def _indexes(self, since: float) -> list[int]:
+        """Slots of the samples taken at or after since, oldest first."""
+        start = (self._next - self._size) % self.capacity
+        order = [(start + offset) % self.capacity for offset in range(self._size)]
+        # Timestamps grow along the ring, skip the samples that are too old
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._times[order[middle]] < since:
+                low = middle + 1
+            else:
+                high = middle
+        return order[low:]
+
+    def as_dict(self, since: float = -math.inf) -> dict[str, list[Any]]:
+        """Return the samples taken at or after since, as one list per column."""
+        indexes = self._indexes(since)
+        samples: dict[str, list[Any]] = {"time": [self._times[index] for index in indexes]}
+        for key, column in self._columns.items():
+            values = (column[index] for index in indexes)
+            samples[key] = [None if math.isnan(value) else int(value) for value in values]
+        return samples
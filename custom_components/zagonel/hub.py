@@ -0,0 +1,456 @@
+"""Shared MQTT connection for zagonel devices."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Mapping
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import Any
+
+import async_timeout
+import paho.mqtt.client as mqtt
+from homeassistant.const import CONF_HOST, CONF_PORT, EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import Event, HomeAssistant, callback
+
+from .api import ZagonelApiClientCommunicationError
+from .const import (
+    CONF_TLS,
+    CONF_TRANSPORT,
+    DATA_HUBS,
+    DEFAULT_TRANSPORT,
+    DOMAIN,
+    MQTT_HOST,
+    MQTT_PORT,
+    OUTBOX_MAX_AGE,
+    OUTBOX_SIZE,
+    RECONNECT_MAX_DELAY,
+    RECONNECT_MIN_DELAY,
+    STARTUP_CONCURRENCY,
+    STARTUP_STAGGER,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+MessageCallback = Callable[[mqtt.MQTTMessage], None]
+
+CONNECT_TIMEOUT = 10
+
+
+@dataclass(slots=True)
+class ZagonelConnectionStats:
+    """Counters of the shared connection."""
+
+    connects: int = 0
+    disconnects: int = 0
+    reconnect_attempts: int = 0
+    queued: int = 0
+    expired: int = 0
+    rejected: int = 0
+    last_connected: float | None = None
+    last_disconnected: float | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        """Counters as a dict."""
+        return asdict(self)
+
+
+class ZagonelStartupThrottle:
+    """Limit and stagger the first requests of devices starting together."""
+
+    def __init__(
+            self,
+            loop: asyncio.AbstractEventLoop,
+            concurrency: int = STARTUP_CONCURRENCY,
+            stagger: float = STARTUP_STAGGER,
+    ) -> None:
+        """Initialize."""
+        self._loop = loop
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._stagger = stagger
+        self._next_start = 0.0
+
+    @asynccontextmanager
+    async def async_slot(self) -> AsyncIterator[None]:
+        """Wait for a free slot, at least stagger seconds after the previous one."""
+        async with self._semaphore:
+            now = self._loop.time()
+            start = max(now, self._next_start)
+            self._next_start = start + self._stagger
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+class ZagonelMqttHub:
+    """Single MQTT connection multiplexing the topics of every device.
+
+    The paho socket is driven by the event loop instead of paho's network
+    thread, so every callback, including message callbacks, runs in the loop.
+    """
+
+    def __init__(
+            self,
+            loop: asyncio.AbstractEventLoop,
+            host: str = MQTT_HOST,
+            port: int = MQTT_PORT,
+            transport: str = DEFAULT_TRANSPORT,
+            tls: bool = False,
+    ) -> None:
+        """Initialize."""
+        self._loop = loop
+        self._host = host
+        self._port = port
+        self._tls = tls
+        self._tls_configured = False
+        self._client = mqtt.Client(transport=transport)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_message = self._on_message
+        self._client.on_socket_open = self._on_socket_open
+        self._client.on_socket_close = self._on_socket_close
+        self._client.on_socket_register_write = self._on_socket_register_write
+        self._client.on_socket_unregister_write = self._on_socket_unregister_write
+        self._subscriptions: dict[str, list[MessageCallback]] = {}
+        self._started = False
+        self._connect_lock = asyncio.Lock()
+        self._connected = asyncio.Event()
+        self._sock: Any = None
+        self._misc_task: asyncio.Task | None = None
+        self._reconnect_task: asyncio.Task | None = None
+        self._reconnect_listeners: list[Callable[[], None]] = []
+        self._disconnect_listeners: list[Callable[[], None]] = []
+        self._release_listeners: list[Callable[[], None]] = []
+        # Publishes waiting for the connection: (topic, payload, future)
+        self._outbox: deque[tuple[str, str, asyncio.Future[None]]] = deque()
+        self.stats = ZagonelConnectionStats()
+        self.startup = ZagonelStartupThrottle(loop)
+
+    def is_connected(self) -> bool:
+        """is_connected."""
+        return self._client.is_connected()
+
+    @property
+    def state(self) -> str:
+        """State of the connection."""
+        if self._connected.is_set():
+            return "connected"
+        if self._reconnect_task and not self._reconnect_task.done():
+            return "reconnecting"
+        return "disconnected"
+
+    def add_reconnect_listener(self, reconnect_callback: Callable[[], None]) -> Callable[[], None]:
+        """Listen for the connection coming back after an outage."""
+        self._reconnect_listeners.append(reconnect_callback)
+
+        def remove_listener() -> None:
+            """Remove reconnect listener."""
+            if reconnect_callback in self._reconnect_listeners:
+                self._reconnect_listeners.remove(reconnect_callback)
+
+        return remove_listener
+
+    def add_disconnect_listener(self, disconnect_callback: Callable[[], None]) -> Callable[[], None]:
+        """Listen for the connection dropping unexpectedly."""
+        self._disconnect_listeners.append(disconnect_callback)
+
+        def remove_listener() -> None:
+            """Remove disconnect listener."""
+            if disconnect_callback in self._disconnect_listeners:
+                self._disconnect_listeners.remove(disconnect_callback)
+
+        return remove_listener
+
+    def add_release_listener(self, release_callback: Callable[[], None]) -> None:
+        """Listen for the last subscription being released."""
+        self._release_listeners.append(release_callback)
+
+    async def async_connect(self) -> None:
+        """Connect once, later calls reuse the connection."""
+        async with self._connect_lock:
+            if self._started:
+                return
+            await self._async_open()
+            self._started = True
+
+    async def _async_open(self) -> None:
+        """Open a new connection and wait until the broker accepts it."""
+        _LOGGER.debug("Connecting to mqtt")
+        self._connected.clear()
+        self._close_socket()
+        try:
+            # Resolving, loading certificates and handshakes block, keep them off the loop
+            await self._loop.run_in_executor(None, self._connect)
+            # Subscriptions are sent on connect, wait so they precede any publish
+            async with async_timeout.timeout(CONNECT_TIMEOUT):
+                await self._connected.wait()
+        except (OSError, ValueError, asyncio.TimeoutError) as exception:
+            self._close_socket()
+            raise ZagonelApiClientCommunicationError(
+                f"Failed to connect to {self._host}:{self._port}"
+            ) from exception
+
+    def _connect(self) -> None:
+        """Open the connection, run in the executor."""
+        if self._tls and not self._tls_configured:
+            self._client.tls_set()
+            self._tls_configured = True
+        self._client.connect(self._host, self._port)
+
+    def disconnect(self) -> None:
+        """Disconnect and stop the network loop."""
+        if not self._started:
+            return
+        _LOGGER.debug("Disconnecting from mqtt")
+        self._started = False
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        self._close_socket()
+        if self._misc_task:
+            self._misc_task.cancel()
+            self._misc_task = None
+        while self._outbox:
+            (_, _, fut) = self._outbox.popleft()
+            if not fut.done():
+                fut.set_exception(ZagonelApiClientCommunicationError("Disconnected from mqtt"))
+
+    def subscribe(self, topic: str, message_callback: MessageCallback) -> Callable[[], None]:
+        """Route messages of topic to callback, returns a function to unsubscribe."""
+        callbacks = self._subscriptions.setdefault(topic, [])
+        callbacks.append(message_callback)
+        if len(callbacks) == 1:
+            self._subscribe(topic)
+
+        def unsubscribe() -> None:
+            """Drop the callback, releasing the topic and connection when unused."""
+            if message_callback not in callbacks:
+                return
+            callbacks.remove(message_callback)
+            if callbacks:
+                return
+            del self._subscriptions[topic]
+            self._client.unsubscribe(topic)
+            if not self._subscriptions:
+                self.disconnect()
+                for release_callback in list(self._release_listeners):
+                    release_callback()
+
+        return unsubscribe
+
+    async def async_publish(self, topic: str, payload: str) -> None:
+        """Publish payload to topic, holding it while the connection is down."""
+        if self._connected.is_set():
+            info = self._client.publish(topic, payload)
+            if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                return
+            if info.rc != mqtt.MQTT_ERR_NO_CONN:
+                raise ZagonelApiClientCommunicationError(
+                    f"Failed to publish ({mqtt.error_string(info.rc)})"
+                )
+        if len(self._outbox) >= OUTBOX_SIZE:
+            self.stats.rejected += 1
+            raise ZagonelApiClientCommunicationError("Not connected and too many commands waiting")
+        fut: asyncio.Future[None] = self._loop.create_future()
+        entry = (topic, payload, fut)
+        self._outbox.append(entry)
+        self.stats.queued += 1
+        try:
+            async with async_timeout.timeout(OUTBOX_MAX_AGE):
+                await fut
+        except asyncio.TimeoutError as exception:
+            self.stats.expired += 1
+            raise ZagonelApiClientCommunicationError(
+                "Timed out waiting for the connection"
+            ) from exception
+        finally:
+            if entry in self._outbox:
+                self._outbox.remove(entry)
+
+    def _flush_outbox(self) -> None:
+        """Publish what was held while the connection was down, oldest first."""
+        while self._outbox:
+            (topic, payload, fut) = self._outbox[0]
+            if not fut.done():
+                info = self._client.publish(topic, payload)
+                if info.rc == mqtt.MQTT_ERR_NO_CONN:
+                    return
+                if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                    fut.set_result(None)
+                else:
+                    fut.set_exception(ZagonelApiClientCommunicationError(
+                        f"Failed to publish ({mqtt.error_string(info.rc)})"
+                    ))
+            self._outbox.popleft()
+
+    def _subscribe(self, topic: str) -> None:
+        """Subscribe to topic on the broker."""
+        (info, _) = self._client.subscribe(topic)
+        if info == mqtt.MQTT_ERR_SUCCESS:
+            _LOGGER.debug("Subscribed to %s", topic)
+        elif info != mqtt.MQTT_ERR_NO_CONN:
+            _LOGGER.warning("Failed to subscribe to %s (%s)", topic, mqtt.error_string(info))
+
+    def _on_connect(self, _client=None, _userdata=None, _flags_dict=None, reason=0, _properties=None):
+        """Subscribe to every topic in use, then send what was held meanwhile."""
+        if reason:
+            _LOGGER.warning("Connection refused by mqtt broker (%s)", mqtt.connack_string(reason))
+            return
+        _LOGGER.debug("Connected to mqtt")
+        self.stats.connects += 1
+        self.stats.last_connected = time.time()
+        self._connected.set()
+        for topic in list(self._subscriptions):
+            self._subscribe(topic)
+        self._flush_outbox()
+
+    def _on_disconnect(self, _client=None, _userdata=None, reason=0, _properties=None):
+        """Start reconnecting when the connection drops unexpectedly."""
+        self._call_in_loop(self._handle_disconnect, reason)
+
+    def _handle_disconnect(self, reason: int) -> None:
+        """Record the disconnect and start the reconnect supervisor if needed."""
+        if self._connected.is_set():
+            self.stats.disconnects += 1
+            self.stats.last_disconnected = time.time()
+        self._connected.clear()
+        if not self._started or reason == mqtt.MQTT_ERR_SUCCESS:
+            return
+        if self._reconnect_task is None or self._reconnect_task.done():
+            _LOGGER.warning("Lost connection to mqtt (%s), reconnecting", mqtt.error_string(reason))
+            self._reconnect_task = self._loop.create_task(self._async_reconnect())
+            for disconnect_callback in list(self._disconnect_listeners):
+                disconnect_callback()
+
+    async def _async_reconnect(self) -> None:
+        """Reconnect with jittered exponential backoff until connected."""
+        attempt = 0
+        while self._started and not self._connected.is_set():
+            delay = min(RECONNECT_MAX_DELAY, RECONNECT_MIN_DELAY * 2 ** attempt)
+            # Jitter so instances sharing a broker don't reconnect in lockstep
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+            attempt += 1
+            self.stats.reconnect_attempts += 1
+            async with self._connect_lock:
+                if not self._started:
+                    return
+                try:
+                    await self._async_open()
+                except ZagonelApiClientCommunicationError as exception:
+                    _LOGGER.debug("Reconnect attempt %s failed: %s", attempt, exception)
+                    continue
+        _LOGGER.info("Reconnected to mqtt after %s attempts", attempt)
+        for reconnect_callback in list(self._reconnect_listeners):
+            reconnect_callback()
+
+    def _on_message(self, _client=None, _userdata=None, message: mqtt.MQTTMessage = None):
+        """Route a message to the callbacks of its topic."""
+        for message_callback in list(self._subscriptions.get(message.topic, ())):
+            try:
+                message_callback(message)
+            except Exception:
+                # Raising would abort paho's read of the socket
+                _LOGGER.exception("Error handling message on %s", message.topic)
+
+    def _close_socket(self) -> None:
+        """Send DISCONNECT and close the socket from the loop.
+
+        Paho would otherwise close a leftover socket from the executor while
+        connecting, and its descriptor could be reused before the loop stops
+        watching it.
+        """
+        if self._client.socket() is None:
+            return
+        self._client.disconnect()
+        self._client.loop_write()
+
+    def _call_in_loop(self, func: Callable[..., None], *args: Any) -> None:
+        """Run func in the event loop, socket callbacks may come from the executor."""
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            func(*args)
+        else:
+            self._loop.call_soon_threadsafe(func, *args)
+
+    def _on_socket_open(self, _client, _userdata, sock) -> None:
+        """Start watching the socket."""
+        self._call_in_loop(self._add_socket, sock)
+
+    def _on_socket_close(self, _client, _userdata, sock) -> None:
+        """Stop watching the socket."""
+        # The socket is closed right after this callback, remember its descriptor
+        self._call_in_loop(self._remove_socket, sock.fileno())
+
+    def _on_socket_register_write(self, _client, _userdata, sock) -> None:
+        """Watch the socket for writing while paho has data to send."""
+        self._call_in_loop(self._loop.add_writer, sock.fileno(), self._client.loop_write)
+
+    def _on_socket_unregister_write(self, _client, _userdata, sock) -> None:
+        """Stop watching the socket for writing."""
+        self._call_in_loop(self._loop.remove_writer, sock.fileno())
+
+    def _add_socket(self, sock) -> None:
+        """Read from sock in the loop and start the keepalive task."""
+        self._sock = sock
+        self._loop.add_reader(sock.fileno(), self._on_socket_readable)
+        if self._misc_task is None or self._misc_task.done():
+            self._misc_task = self._loop.create_task(self._async_misc_loop())
+
+    def _remove_socket(self, fileno: int) -> None:
+        """Forget a closed socket."""
+        self._sock = None
+        self._loop.remove_reader(fileno)
+        self._loop.remove_writer(fileno)
+
+    def _on_socket_readable(self) -> None:
+        """Read every packet available, including data buffered by the websocket."""
+        self._client.loop_read()
+        while (sock := self._sock) is not None and hasattr(sock, "pending") and sock.pending():
+            self._client.loop_read()
+
+    async def _async_misc_loop(self) -> None:
+        """Send keepalive pings and retry pending messages."""
+        while self._client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+
+def broker_settings(config: Mapping[str, Any]) -> tuple[str, int, str, bool]:
+    """Host, port, transport and TLS of the broker in a config entry's data or options."""
+    return (
+        config.get(CONF_HOST, MQTT_HOST),
+        int(config.get(CONF_PORT, MQTT_PORT)),
+        config.get(CONF_TRANSPORT, DEFAULT_TRANSPORT),
+        config.get(CONF_TLS, False),
+    )
+
+
+@callback
+def async_get_hub(hass: HomeAssistant, config: Mapping[str, Any]) -> ZagonelMqttHub:
+    """Get the hub shared by all config entries using the same broker."""
+    hubs: dict[tuple, ZagonelMqttHub] = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_HUBS, {})
+    settings = broker_settings(config)
+    if (hub := hubs.get(settings)) is None:
+        hub = hubs[settings] = ZagonelMqttHub(hass.loop, *settings)
+
+        @callback
+        def stop_hub(_event: Event) -> None:
+            """Disconnect while the loop still runs, entries aren't unloaded at shutdown."""
+            hub.disconnect()
+
+        remove_stop_listener = hass.bus.async_listen(EVENT_HOMEASSISTANT_STOP, stop_hub)
+
+        @callback
+        def forget_hub() -> None:
+            """Drop the unused hub, a mistyped or abandoned broker would keep it forever."""
+            if hubs.get(settings) is hub:
+                del hubs[settings]
+                remove_stop_listener()
+
+        hub.add_release_listener(forget_hub)
+    return hub
@@ -5,11 +5,12 @@ from typing import Any
 
 import homeassistant.util.color as color_util
 from homeassistant.components.light import ColorMode, LightEntity, LightEntityDescription
+from homeassistant.core import callback
 from homeassistant.util import slugify
 from .api import ZagonelRGBMode
 from .const import DOMAIN
 from .coordinator import ZagonelDataUpdateCoordinator
-from .entity import ZagonelEntity
+from .entity import ZagonelEntity, data_keys
 
 ENTITY_DESCRIPTIONS = (
     LightEntityDescription(
@@ -38,6 +39,7 @@ async def async_setup_entry(hass, entry, async_add_devices):
 class ZagonelLight(ZagonelEntity, LightEntity):
     """Zagonel Light class."""
 
+    _data_keys = data_keys("Rgb_Mode", "Rgb_Color")
     _attr_color_mode = ColorMode.RGB
     _attr_supported_color_modes = {ColorMode.RGB}
 
@@ -51,31 +53,27 @@ class ZagonelLight(ZagonelEntity, LightEntity):
         super().__init__(unique_id, coordinator)
         self.entity_description = entity_description
 
-    @property
-    def rgb_color(self) -> tuple[int, int, int] | None:
-        """Return the rgb color value [int, int, int]."""
-        hex_color = self.coordinator.data.chars.Rgb_Color
-        rgb_color = color_util.rgb_hex_to_rgb_list(hex_color[1:])
-        return rgb_color[0], rgb_color[1], rgb_color[2]
-
-    @property
-    def is_on(self) -> bool | None:
-        """Return True if entity is on."""
-        return self.coordinator.data.chars.Rgb_Mode == ZagonelRGBMode.FIXED
+    @callback
+    def _update_attrs(self) -> None:
+        """Compute the color and whether the light is on."""
+        chars = self.coordinator.data.chars
+        if chars.Rgb_Color is None:
+            self._attr_rgb_color = None
+        else:
+            rgb_color = color_util.rgb_hex_to_rgb_list(chars.Rgb_Color[1:])
+            self._attr_rgb_color = rgb_color[0], rgb_color[1], rgb_color[2]
+        self._attr_is_on = chars.Rgb_Mode == ZagonelRGBMode.FIXED
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Turn the entity on."""
+        values = {}
         if not self.is_on:
-            await self.send(
-                "Rgb_Mode",
-                ZagonelRGBMode.FIXED
-            )
+            values["Rgb_Mode"] = ZagonelRGBMode.FIXED
         rgb_color = kwargs.get("rgb_color")
         if rgb_color is not None:
-            await self.send(
-                "Rgb_Color",
-                f"#{color_util.color_rgb_to_hex(rgb_color[0], rgb_color[1], rgb_color[2]).upper()}"
-            )
+            values["Rgb_Color"] = f"#{color_util.color_rgb_to_hex(rgb_color[0], rgb_color[1], rgb_color[2]).upper()}"
+        if values:
+            await self.send_many(values)
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Turn the entity off."""
@@ -0,0 +1,144 @@
+"""Latency and throughput counters of a zagonel device."""
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass(slots=True)
+class ZagonelHistogram:
+    """Observations counted in fixed buckets, so memory doesn't grow with them."""
+
+    counts: list[int] = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+    count: int = 0
+    total: float = 0.0
+    min: float | None = None
+    max: float | None = None
+    last: float | None = None
+
+    def observe(self, value: float) -> None:
+        """Count an observation."""
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.last = value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float | None:
+        """Mean of the observations."""
+        return self.total / self.count if self.count else None
+
+    def percentile(self, fraction: float) -> float | None:
+        """Upper bound of the bucket holding the given fraction of observations."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, bucket_count in zip(BUCKETS, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def as_dict(self) -> dict[str, Any]:
+        """Summary of the observations."""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "last": self.last,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "buckets": dict(zip([*map(str, BUCKETS), "inf"], self.counts)),
+        }
+
+
+@dataclass(slots=True)
+class ZagonelRate:
+    """Events per second, measured over consecutive windows."""
+
+    window: float = 60.0
+    total: int = 0
+    _window_start: float = field(default_factory=time.monotonic)
+    _window_count: int = 0
+    _rate: float = 0.0
+
+    def mark(self) -> None:
+        """Count an event."""
+        now = time.monotonic()
+        if (elapsed := now - self._window_start) >= self.window:
+            self._rate = self._window_count / elapsed
+            self._window_start = now
+            self._window_count = 0
+        self._window_count += 1
+        self.total += 1
+
+    @property
+    def rate(self) -> float:
+        """Events per second in the last complete window."""
+        if (elapsed := time.monotonic() - self._window_start) >= self.window:
+            # Nothing marked since the window ended
+            return self._window_count / elapsed
+        return self._rate
+
+
+@dataclass(slots=True)
+class ZagonelMetrics:
+    """Instrumentation of the requests and messages of a device."""
+
+    reply: ZagonelHistogram = field(default_factory=ZagonelHistogram)
+    # Publish to reply latency of each command
+    commands: dict[str, ZagonelHistogram] = field(default_factory=dict)
+    timeouts: dict[str, int] = field(default_factory=dict)
+    messages: ZagonelRate = field(default_factory=ZagonelRate)
+    decode: ZagonelHistogram = field(default_factory=ZagonelHistogram)
+    refresh: ZagonelHistogram = field(default_factory=ZagonelHistogram)
+    # Messages set aside, by reason
+    rejected: dict[str, int] = field(default_factory=dict)
+
+    def observe_reply(self, command: str, seconds: float) -> None:
+        """Count the latency of a reply to command."""
+        self.reply.observe(seconds)
+        if (histogram := self.commands.get(command)) is None:
+            histogram = self.commands[command] = ZagonelHistogram()
+        histogram.observe(seconds)
+
+    def observe_timeout(self, command: str) -> None:
+        """Count a command left without reply."""
+        self.timeouts[command] = self.timeouts.get(command, 0) + 1
+
+    @property
+    def total_timeouts(self) -> int:
+        """Timeouts of every command."""
+        return sum(self.timeouts.values())
+
+    def observe_rejected(self, reason: str) -> None:
+        """Count a message set aside for reason."""
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    @property
+    def total_rejected(self) -> int:
+        """Messages set aside for any reason."""
+        return sum(self.rejected.values())
+
+    def as_dict(self) -> dict[str, Any]:
+        """Every counter, for diagnostics."""
+        return {
+            "reply": self.reply.as_dict(),
+            "commands": {command: histogram.as_dict() for command, histogram in self.commands.items()},
+            "timeouts": dict(self.timeouts),
+            "messages": {"total": self.messages.total, "per_second": self.messages.rate},
+            "decode": self.decode.as_dict(),
+            "refresh": self.refresh.as_dict(),
+            "rejected": dict(self.rejected),
+        }
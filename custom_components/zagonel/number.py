@@ -2,11 +2,12 @@
 from __future__ import annotations
 
 from homeassistant.components.number import NumberEntity, NumberEntityDescription
+from homeassistant.core import callback
 from homeassistant.util import slugify
 
 from .const import DOMAIN
 from .coordinator import ZagonelDataUpdateCoordinator
-from .entity import ZagonelEntity
+from .entity import ZagonelEntity, data_keys
 
 ENTITY_DESCRIPTIONS = (
     NumberEntityDescription(
@@ -39,6 +40,8 @@ async def async_setup_entry(hass, entry, async_add_devices):
 class ZagonelNumber(ZagonelEntity, NumberEntity):
     """Zagonel Number class."""
 
+    _data_keys = data_keys("Buzzer_Volume")
+
     def __init__(
             self,
             unique_id: str,
@@ -49,10 +52,10 @@ class ZagonelNumber(ZagonelEntity, NumberEntity):
         super().__init__(unique_id, coordinator)
         self.entity_description = entity_description
 
-    @property
-    def native_value(self) -> float | None:
-        """Get native value."""
-        return self.coordinator.client.data.chars.Buzzer_Volume
+    @callback
+    def _update_attrs(self) -> None:
+        """Compute the volume."""
+        self._attr_native_value = self.coordinator.data.chars.Buzzer_Volume
 
     async def async_set_native_value(self, value: float) -> None:
         """Set native value."""
@@ -5,12 +5,13 @@ from dataclasses import dataclass
 from enum import Enum
 
 from homeassistant.components.select import SelectEntity, SelectEntityDescription
+from homeassistant.core import callback
 from homeassistant.util import slugify
 
 from .api import ZagonelControlMode, ZagonelParentalMode, ZagonelRGBMode
 from .const import DOMAIN
 from .coordinator import ZagonelDataUpdateCoordinator
-from .entity import ZagonelEntity
+from .entity import ZagonelEntity, data_keys
 
 
 @dataclass
@@ -87,11 +88,13 @@ class ZagonelSelect(ZagonelEntity, SelectEntity):
         """Initialize the sensor class."""
         super().__init__(unique_id, coordinator)
         self.entity_description = entity_description
+        self._data_keys = data_keys(entity_description.dict_key)
 
-    @property
-    def current_option(self) -> str | None:
-        """Return the selected entity option to represent the entity state."""
-        return getattr(self.coordinator.data.chars, self.entity_description.dict_key).name
+    @callback
+    def _update_attrs(self) -> None:
+        """Compute the selected option."""
+        value = getattr(self.coordinator.data.chars, self.entity_description.dict_key)
+        self._attr_current_option = None if value is None else value.name
 
     async def async_select_option(self, option: str) -> None:
         """Change the selected option."""
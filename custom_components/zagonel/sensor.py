@@ -1,8 +1,11 @@
 """Sensor platform for zagonel."""
 from __future__ import annotations
 
+import math
+import time
 from dataclasses import dataclass
-from typing import TypeVar
+from datetime import datetime
+from typing import Any, TypeVar
 from collections.abc import Callable
 
 from homeassistant.components.sensor import (
@@ -11,19 +14,25 @@ from homeassistant.components.sensor import (
     SensorEntityDescription, SensorStateClass,
 )
 from homeassistant.const import (
+    EntityCategory,
     PERCENTAGE,
     SIGNAL_STRENGTH_DECIBELS,
     UnitOfElectricPotential,
+    UnitOfEnergy,
     UnitOfPower,
     UnitOfTemperature,
     UnitOfTime,
     UnitOfVolume,
 )
+from homeassistant.core import CALLBACK_TYPE, callback
+from homeassistant.helpers.event import async_call_later
 from homeassistant.util import slugify
 
-from .const import DOMAIN
+from .const import CONF_DEADBAND, CONF_MIN_INTERVAL, DOMAIN
 from .coordinator import ZagonelDataUpdateCoordinator
-from .entity import ZagonelEntity
+from .entity import ZagonelEntity, data_keys
+from .metrics import ZagonelMetrics
+from .session import SESSION_KEY, ZagonelSessionTracker
 
 T = TypeVar("T")
 
@@ -33,6 +42,10 @@ class ZagonelSensorEntityDescriptionMixin:
     """ZagonelSensorEntityDescriptionMixin."""
 
     value: Callable[[T], T] = None
+    # Smallest change of the value worth writing, 0 to write every change
+    deadband: float = 0
+    # Seconds between writes, a change held back is written when they elapse
+    min_interval: float = 0
 
 
 @dataclass
@@ -66,6 +79,8 @@ ENTITY_DESCRIPTIONS = (
         native_unit_of_measurement=UnitOfElectricPotential.VOLT,
         suggested_display_precision=2,
         value=lambda value: value / 1000,
+        deadband=1,
+        min_interval=60,
     ),
     ZagonelSensorEntityDescription(
         key="Ti",
@@ -88,6 +103,8 @@ ENTITY_DESCRIPTIONS = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.POWER_FACTOR,
         native_unit_of_measurement=PERCENTAGE,
+        deadband=2,
+        min_interval=10,
     ),
     ZagonelSensorEntityDescription(
         key="De",
@@ -119,6 +136,7 @@ ENTITY_DESCRIPTIONS = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.DURATION,
         native_unit_of_measurement=UnitOfTime.SECONDS,
+        min_interval=300,
     ),
     ZagonelSensorEntityDescription(
         key="Pp",
@@ -132,6 +150,153 @@ ENTITY_DESCRIPTIONS = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.SIGNAL_STRENGTH,
         native_unit_of_measurement=SIGNAL_STRENGTH_DECIBELS,
+        deadband=3,
+        min_interval=60,
+    ),
+)
+
+# Sensors whose deadband and minimum interval can be changed in the options
+FILTERED_ENTITY_DESCRIPTIONS = tuple(
+    entity_description for entity_description in ENTITY_DESCRIPTIONS
+    if entity_description.deadband or entity_description.min_interval
+)
+
+
+@dataclass
+class ZagonelMetricSensorEntityDescription(SensorEntityDescription):
+    """ZagonelMetricSensorEntityDescription."""
+
+    value: Callable[[ZagonelMetrics], Any] = None
+
+
+def _milliseconds(seconds: float | None) -> float | None:
+    """Convert seconds to milliseconds."""
+    return None if seconds is None else seconds * 1000
+
+
+METRIC_ENTITY_DESCRIPTIONS = (
+    ZagonelMetricSensorEntityDescription(
+        key="reply_latency",
+        name="Reply latency",
+        translation_key="reply_latency",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        suggested_display_precision=0,
+        value=lambda metrics: _milliseconds(metrics.reply.mean),
+    ),
+    ZagonelMetricSensorEntityDescription(
+        key="command_timeouts",
+        name="Command timeouts",
+        translation_key="command_timeouts",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value=lambda metrics: metrics.total_timeouts,
+    ),
+    ZagonelMetricSensorEntityDescription(
+        key="rejected_messages",
+        name="Rejected messages",
+        translation_key="rejected_messages",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value=lambda metrics: metrics.total_rejected,
+    ),
+    ZagonelMetricSensorEntityDescription(
+        key="message_rate",
+        name="Messages per minute",
+        translation_key="message_rate",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement="messages/min",
+        suggested_display_precision=1,
+        value=lambda metrics: metrics.messages.rate * 60,
+    ),
+    ZagonelMetricSensorEntityDescription(
+        key="decode_time",
+        name="Decode time",
+        translation_key="decode_time",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        suggested_display_precision=3,
+        value=lambda metrics: _milliseconds(metrics.decode.mean),
+    ),
+    ZagonelMetricSensorEntityDescription(
+        key="refresh_duration",
+        name="Refresh duration",
+        translation_key="refresh_duration",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        suggested_display_precision=0,
+        value=lambda metrics: _milliseconds(metrics.refresh.last),
+    ),
+)
+
+
+@dataclass
+class ZagonelSessionSensorEntityDescription(SensorEntityDescription):
+    """ZagonelSessionSensorEntityDescription."""
+
+    value: Callable[[ZagonelSessionTracker], Any] = None
+
+
+SESSION_ENTITY_DESCRIPTIONS = (
+    ZagonelSessionSensorEntityDescription(
+        key="last_session_energy",
+        name="Last shower energy",
+        translation_key="last_session_energy",
+        device_class=SensorDeviceClass.ENERGY,
+        native_unit_of_measurement=UnitOfEnergy.WATT_HOUR,
+        suggested_display_precision=0,
+        value=lambda sessions: sessions.last.energy if sessions.last else None,
+    ),
+    ZagonelSessionSensorEntityDescription(
+        key="last_session_water",
+        name="Last shower water",
+        translation_key="last_session_water",
+        device_class=SensorDeviceClass.WATER,
+        native_unit_of_measurement=UnitOfVolume.LITERS,
+        suggested_display_precision=1,
+        value=lambda sessions: sessions.last.water if sessions.last else None,
+    ),
+    ZagonelSessionSensorEntityDescription(
+        key="last_session_duration",
+        name="Last shower duration",
+        translation_key="last_session_duration",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        suggested_display_precision=0,
+        value=lambda sessions: sessions.last.duration if sessions.last else None,
+    ),
+    ZagonelSessionSensorEntityDescription(
+        key="total_energy",
+        name="Total energy",
+        translation_key="total_energy",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        device_class=SensorDeviceClass.ENERGY,
+        native_unit_of_measurement=UnitOfEnergy.WATT_HOUR,
+        suggested_display_precision=0,
+        value=lambda sessions: sessions.total_energy,
+    ),
+    ZagonelSessionSensorEntityDescription(
+        key="total_water",
+        name="Total water",
+        translation_key="total_water",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        device_class=SensorDeviceClass.WATER,
+        native_unit_of_measurement=UnitOfVolume.LITERS,
+        suggested_display_precision=1,
+        value=lambda sessions: sessions.total_water,
     ),
 )
 
@@ -140,14 +305,33 @@ async def async_setup_entry(hass, entry, async_add_devices):
     """Set up the sensor platform."""
     coordinator = hass.data[DOMAIN][entry.entry_id]
     unique_id = slugify(coordinator.data.chars.Device_Id)
+    options = entry.options
     async_add_devices(
         ZagonelSensor(
             unique_id=f"{entity_description.key}_{unique_id}",
             coordinator=coordinator,
             entity_description=entity_description,
+            deadband=options.get(f"{entity_description.key}_{CONF_DEADBAND}"),
+            min_interval=options.get(f"{entity_description.key}_{CONF_MIN_INTERVAL}"),
         )
         for entity_description in ENTITY_DESCRIPTIONS
     )
+    async_add_devices(
+        ZagonelMetricSensor(
+            unique_id=f"{entity_description.key}_{unique_id}",
+            coordinator=coordinator,
+            entity_description=entity_description,
+        )
+        for entity_description in METRIC_ENTITY_DESCRIPTIONS
+    )
+    async_add_devices(
+        ZagonelSessionSensor(
+            unique_id=f"{entity_description.key}_{unique_id}",
+            coordinator=coordinator,
+            entity_description=entity_description,
+        )
+        for entity_description in SESSION_ENTITY_DESCRIPTIONS
+    )
 
 
 class ZagonelSensor(ZagonelEntity, SensorEntity):
@@ -160,15 +344,133 @@ class ZagonelSensor(ZagonelEntity, SensorEntity):
             unique_id: str,
             coordinator: ZagonelDataUpdateCoordinator,
             entity_description: ZagonelSensorEntityDescription,
+            deadband: float | None = None,
+            min_interval: float | None = None,
     ) -> None:
         """Initialize the sensor class."""
         super().__init__(unique_id, coordinator)
         self.entity_description = entity_description
+        self._data_keys = data_keys(entity_description.key)
+        self._deadband = entity_description.deadband if deadband is None else deadband
+        self._min_interval = entity_description.min_interval if min_interval is None else min_interval
+        # Value last written and when, against which changes are filtered
+        self._written: Any = None
+        self._written_at = -math.inf
+        self._unsub_flush: CALLBACK_TYPE | None = None
+
+    async def async_added_to_hass(self) -> None:
+        """Drop a held back change when removed."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._cancel_flush)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Hold back changes within the deadband or sooner than the minimum interval."""
+        data = self.coordinator.data
+        if (
+                (self._deadband or self._min_interval)
+                and data is not None
+                and self.available == self._last_available
+                and not self._data_keys.isdisjoint(data.changed)
+                and self._hold(self._value())
+        ):
+            return
+        super()._handle_coordinator_update()
 
-    @property
-    def native_value(self):
-        """Return the value reported by the sensor."""
-        value = getattr(self.coordinator.data.status, self.entity_description.key)
-        if self.entity_description.value:
+    @callback
+    def _update_attrs(self) -> None:
+        """Compute the value reported by the sensor."""
+        self._attr_native_value = self._value()
+
+    def _value(self) -> Any:
+        """Return the value of the field, converted."""
+        if (status := self.coordinator.data.status) is None:
+            return None
+        value = getattr(status, self.entity_description.key)
+        if value is not None and self.entity_description.value:
             return self.entity_description.value(value)
         return value
+
+    @callback
+    def async_write_ha_state(self) -> None:
+        """Write state, remembering the value written."""
+        self._cancel_flush()
+        self._written = self._attr_native_value
+        self._written_at = time.monotonic()
+        super().async_write_ha_state()
+
+    def _moved(self, value: Any) -> bool:
+        """Return whether value differs from the one written by the deadband."""
+        written = self._written
+        if value is None or written is None or isinstance(value, str):
+            return value != written
+        return abs(value - written) >= self._deadband
+
+    def _hold(self, value: Any) -> bool:
+        """Return whether value should not be written now, scheduling it if due later."""
+        if not self._moved(value):
+            return True
+        delay = self._written_at + self._min_interval - time.monotonic()
+        if delay <= 0:
+            return False
+        if self._unsub_flush is None:
+            self._unsub_flush = async_call_later(self.hass, delay, self._flush)
+        return True
+
+    @callback
+    def _flush(self, _now: datetime) -> None:
+        """Write the change held back by the minimum interval."""
+        self._unsub_flush = None
+        if self.available == self._last_available and self._moved(self._value()):
+            self._update_attrs()
+            self.async_write_ha_state()
+
+    @callback
+    def _cancel_flush(self) -> None:
+        """Cancel writing a held back change."""
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
+
+
+class ZagonelMetricSensor(ZagonelEntity, SensorEntity):
+    """Zagonel diagnostic sensor of the connection to a device."""
+
+    entity_description: ZagonelMetricSensorEntityDescription
+
+    def __init__(
+            self,
+            unique_id: str,
+            coordinator: ZagonelDataUpdateCoordinator,
+            entity_description: ZagonelMetricSensorEntityDescription,
+    ) -> None:
+        """Initialize the sensor class."""
+        super().__init__(unique_id, coordinator)
+        self.entity_description = entity_description
+
+    @callback
+    def _update_attrs(self) -> None:
+        """Compute the value of the metric."""
+        self._attr_native_value = self.entity_description.value(self.coordinator.client.metrics)
+
+
+class ZagonelSessionSensor(ZagonelEntity, SensorEntity):
+    """Zagonel sensor summarizing shower sessions."""
+
+    entity_description: ZagonelSessionSensorEntityDescription
+    _data_keys = data_keys(SESSION_KEY)
+
+    def __init__(
+            self,
+            unique_id: str,
+            coordinator: ZagonelDataUpdateCoordinator,
+            entity_description: ZagonelSessionSensorEntityDescription,
+    ) -> None:
+        """Initialize the sensor class."""
+        super().__init__(unique_id, coordinator)
+        self.entity_description = entity_description
+
+    @callback
+    def _update_attrs(self) -> None:
+        """Compute the value of the session summary."""
+        self._attr_native_value = self.entity_description.value(self.coordinator.sessions)
@@ -0,0 +1,173 @@
+"""Services for zagonel."""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Callable
+from typing import Any
+
+import voluptuous as vol
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+
+from .api import (
+    ZagonelApiClientError,
+    ZagonelControlMode,
+    ZagonelEnum,
+    ZagonelParentalMode,
+    ZagonelRGBMode,
+)
+from .const import (
+    ATTR_MAX_PARALLEL,
+    ATTR_MINUTES,
+    ATTR_VALUES,
+    CONF_DEVICE_ID,
+    DEFAULT_MAX_PARALLEL,
+    DOMAIN,
+    SERVICE_GET_HISTORY,
+    SERVICE_SET_VALUES,
+)
+from .coordinator import ZagonelDataUpdateCoordinator
+
+GET_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_DEVICE_ID): cv.string,
+        vol.Optional(ATTR_MINUTES, default=10): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    }
+)
+
+
+def _enum_value(enum: type[ZagonelEnum]) -> Callable[[Any], int]:
+    """Validate a member of enum, by name or value."""
+    names = {member.name: member.value for member in enum}
+
+    def validate(value: Any) -> int:
+        if value in names:
+            return names[value]
+        try:
+            return enum(int(value)).value
+        except (TypeError, ValueError) as exception:
+            raise vol.Invalid(f"Expected one of {', '.join(names)}") from exception
+
+    return validate
+
+
+def _upper(value: str) -> str:
+    """Upper case a string."""
+    return value.upper()
+
+
+# Chars that can be written, in the units the device uses
+VALUES_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional("Control_Mode"): _enum_value(ZagonelControlMode),
+            vol.Optional("Rgb_Mode"): _enum_value(ZagonelRGBMode),
+            vol.Optional("Rgb_Color"): vol.All(cv.matches_regex(r"^#[0-9A-Fa-f]{6}$"), _upper),
+            vol.Optional("Buzzer_Volume"): vol.All(vol.Coerce(int), vol.Range(min=0, max=100)),
+            vol.Optional("Parental_Mode"): _enum_value(ZagonelParentalMode),
+            vol.Optional("Parental_Limit"): vol.All(vol.Coerce(int), vol.Range(min=0)),
+            **{
+                vol.Optional(f"Preset_{index}"): vol.All(vol.Coerce(int), vol.Range(min=25000, max=50000))
+                for index in range(1, 5)
+            },
+        }
+    ),
+    vol.Length(min=1),
+)
+
+SET_VALUES_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_DEVICE_ID): vol.All(cv.ensure_list, [cv.string]),
+        vol.Required(ATTR_VALUES): VALUES_SCHEMA,
+        vol.Optional(ATTR_MAX_PARALLEL, default=DEFAULT_MAX_PARALLEL): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=100)
+        ),
+    }
+)
+
+
+@callback
+def async_get_coordinators(hass: HomeAssistant) -> dict[str, ZagonelDataUpdateCoordinator]:
+    """Get the coordinators of the loaded devices, by device id."""
+    return {
+        coordinator.client.device_id: coordinator
+        for coordinator in hass.data.get(DOMAIN, {}).values()
+        if isinstance(coordinator, ZagonelDataUpdateCoordinator)
+    }
+
+
+@callback
+def async_get_coordinator(hass: HomeAssistant, device_id: str) -> ZagonelDataUpdateCoordinator:
+    """Get the coordinator of a device."""
+    if (coordinator := async_get_coordinators(hass).get(device_id)) is None:
+        raise HomeAssistantError(f"No zagonel device {device_id} is loaded")
+    return coordinator
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the zagonel services."""
+
+    async def async_get_history(call: ServiceCall) -> ServiceResponse:
+        """Return the status samples of the last minutes."""
+        device_id = call.data[CONF_DEVICE_ID]
+        coordinator = async_get_coordinator(hass, device_id)
+        since = time.time() - call.data[ATTR_MINUTES] * 60
+        return {
+            CONF_DEVICE_ID: device_id,
+            "samples": coordinator.history.as_dict(since),
+        }
+
+    async def async_set_values(call: ServiceCall) -> ServiceResponse:
+        """Write the same values to several devices, a bounded number at once.
+
+        Each device gets its values as a single batch, sent right away, so
+        it is refreshed at most once, when it didn't echo every value.
+        """
+        values = call.data[ATTR_VALUES]
+        coordinators = async_get_coordinators(hass)
+        device_ids = call.data.get(CONF_DEVICE_ID) or list(coordinators)
+        semaphore = asyncio.Semaphore(call.data[ATTR_MAX_PARALLEL])
+
+        async def async_write(device_id: str) -> dict[str, Any]:
+            """Write the values to a device, timing it."""
+            if (coordinator := coordinators.get(device_id)) is None:
+                return {"success": False, "duration": 0.0, "error": "Not loaded"}
+            async with semaphore:
+                start = time.monotonic()
+                error = None
+                try:
+                    await coordinator.async_write(values, immediate=True)
+                except ZagonelApiClientError as exception:
+                    error = str(exception)
+                return {"success": error is None, "duration": time.monotonic() - start, "error": error}
+
+        results = dict(zip(device_ids, await asyncio.gather(*map(async_write, device_ids))))
+        if call.return_response:
+            return {"results": results}
+        if failed := [device_id for device_id, result in results.items() if not result["success"]]:
+            raise HomeAssistantError(f"Failed to write to {', '.join(failed)}")
+        return None
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_HISTORY,
+        async_get_history,
+        schema=GET_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SET_VALUES,
+        async_set_values,
+        schema=SET_VALUES_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
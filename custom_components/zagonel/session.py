@@ -0,0 +1,152 @@
+"""Shower session tracking for zagonel."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+from homeassistant.util import dt as dt_util
+
+from .api import ZagonelStatus
+
+# Pseudo field added to ZagonelData.changed when a session ends
+SESSION_KEY = "session"
+
+
+@dataclass(slots=True)
+class ZagonelSession:
+    """A shower, from the device starting to run until it stops."""
+
+    started: datetime
+    ended: datetime | None = None
+    # Wh
+    energy: float = 0.0
+    # L
+    water: float = 0.0
+    # Mean outlet temperature in °C, weighted by time
+    temperature: float | None = None
+
+    @property
+    def duration(self) -> float:
+        """Seconds the shower ran."""
+        return ((self.ended or dt_util.utcnow()) - self.started).total_seconds()
+
+    def as_dict(self) -> dict[str, Any]:
+        """as_dict."""
+        return {
+            "started": self.started.isoformat(),
+            "ended": self.ended.isoformat() if self.ended else None,
+            "duration": self.duration,
+            "energy": self.energy,
+            "water": self.water,
+            "temperature": self.temperature,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> ZagonelSession:
+        """from_dict."""
+        return cls(
+            started=dt_util.parse_datetime(data["started"]),
+            ended=dt_util.parse_datetime(data["ended"]) if data.get("ended") else None,
+            energy=data.get("energy", 0.0),
+            water=data.get("water", 0.0),
+            temperature=data.get("temperature"),
+        )
+
+
+class ZagonelSessionTracker:
+    """Integrate energy and water over sessions from the status stream.
+
+    The device reports a status whenever it changes and is polled while
+    running, so each sample holds until the next one, for at most
+    max_sample_age seconds. A longer gap means the device or the connection
+    went away, the session then ends max_sample_age after its last sample
+    instead of counting the gap at the last power and flow.
+    """
+
+    def __init__(self, max_sample_age: float) -> None:
+        """Initialize."""
+        self.max_sample_age = max_sample_age
+        self.current: ZagonelSession | None = None
+        self.last: ZagonelSession | None = None
+        self.count = 0
+        self.total_energy = 0.0
+        self.total_water = 0.0
+        self._sampled: datetime | None = None
+        self._power = 0.0
+        self._flow = 0.0
+        self._temperature: float | None = None
+        self._temperature_sum = 0.0
+        self._temperature_seconds = 0.0
+
+    def update(self, status: ZagonelStatus, now: datetime) -> ZagonelSession | None:
+        """Account for a status sample, return the session it ended if any."""
+        running = status.St == "RUN"
+        finished = None
+        if self.current is not None:
+            if (now - self._sampled).total_seconds() > self.max_sample_age:
+                finished = self.interrupt(now)
+            else:
+                self._integrate(now)
+        if running and self.current is None:
+            self.current = ZagonelSession(started=now)
+            self._temperature_sum = self._temperature_seconds = 0.0
+        elif not running and self.current is not None:
+            finished = self._finish(now)
+        if self.current is not None:
+            # Pw is in tenths of W, Fl in mL/min and To in thousandths of °C
+            self._power = (status.Pw or 0) / 10
+            self._flow = (status.Fl or 0) / 1000
+            self._temperature = status.To / 1000 if status.To is not None else None
+            self._sampled = now
+        return finished
+
+    def interrupt(self, now: datetime) -> ZagonelSession | None:
+        """End the current session at its last sample, when nothing more is known."""
+        if self.current is None:
+            return None
+        ended = min(now, self._sampled + timedelta(seconds=self.max_sample_age))
+        self._integrate(ended)
+        return self._finish(ended)
+
+    def _integrate(self, now: datetime) -> None:
+        """Add what the last sample accounts for until now."""
+        seconds = (now - self._sampled).total_seconds()
+        if seconds <= 0:
+            return
+        self.current.energy += self._power * seconds / 3600
+        self.current.water += self._flow * seconds / 60
+        if self._temperature is not None:
+            self._temperature_sum += self._temperature * seconds
+            self._temperature_seconds += seconds
+        self._sampled = now
+
+    def _finish(self, now: datetime) -> ZagonelSession:
+        """End the current session and add it to the totals."""
+        session = self.current
+        session.ended = now
+        if self._temperature_seconds:
+            session.temperature = self._temperature_sum / self._temperature_seconds
+        self.current = None
+        self.last = session
+        self.count += 1
+        self.total_energy += session.energy
+        self.total_water += session.water
+        return session
+
+    def as_dict(self) -> dict[str, Any]:
+        """Totals and last session, to store."""
+        return {
+            "count": self.count,
+            "total_energy": self.total_energy,
+            "total_water": self.total_water,
+            "last": self.last.as_dict() if self.last else None,
+        }
+
+    def restore(self, data: dict[str, Any]) -> None:
+        """Restore totals and last session stored by an earlier session."""
+        self.count = data.get("count", 0)
+        self.total_energy = data.get("total_energy", 0.0)
+        self.total_water = data.get("total_water", 0.0)
+        if last := data.get("last"):
+            self.last = ZagonelSession.from_dict(last)
@@ -4,10 +4,11 @@ from __future__ import annotations
 from datetime import datetime, time, timedelta
 
 from homeassistant.components.time import TimeEntity, TimeEntityDescription
+from homeassistant.core import callback
 from homeassistant.util import slugify
 from .const import DOMAIN
 from .coordinator import ZagonelDataUpdateCoordinator
-from .entity import ZagonelEntity
+from .entity import ZagonelEntity, data_keys
 
 ENTITY_DESCRIPTIONS = (
     TimeEntityDescription(
@@ -36,6 +37,8 @@ async def async_setup_entry(hass, entry, async_add_devices):
 class ZagonelTime(ZagonelEntity, TimeEntity):
     """Zagonel Number class."""
 
+    _data_keys = data_keys("Parental_Limit")
+
     def __init__(
             self,
             unique_id: str,
@@ -46,11 +49,14 @@ class ZagonelTime(ZagonelEntity, TimeEntity):
         super().__init__(unique_id, coordinator)
         self.entity_description = entity_description
 
-    @property
-    def native_value(self) -> time | None:
-        """Get native value."""
-        delta = timedelta(seconds=self.coordinator.client.data.chars.Parental_Limit)
-        return (datetime.min + delta).time()
+    @callback
+    def _update_attrs(self) -> None:
+        """Compute the time limit."""
+        seconds = self.coordinator.data.chars.Parental_Limit
+        if seconds is None:
+            self._attr_native_value = None
+        else:
+            self._attr_native_value = (datetime.min + timedelta(seconds=seconds)).time()
 
     async def async_set_value(self, value: time) -> None:
         """Set native value."""
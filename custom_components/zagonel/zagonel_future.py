@@ -2,6 +2,8 @@
 from __future__ import annotations
 
 from asyncio import Future
+from collections import deque
+from collections.abc import Hashable
 from typing import Any
 
 import async_timeout
@@ -10,19 +12,16 @@ import async_timeout
 class ZagonelFuture:
     """"Class to handle futures."""
 
-    def __init__(self):
+    def __init__(self, expected: Any = None):
         """"Init future."""
         self.fut: Future = Future()
-        self.loop = self.fut.get_loop()
-
-    def _resolve(self, item: Any) -> None:
-        """"Resolve future."""
-        if not self.fut.cancelled():
-            self.fut.set_result(item)
+        # Value the reply must carry, None for any
+        self.expected = expected
 
     def resolve(self, item: Any) -> None:
-        """"Resolve future."""
-        self.loop.call_soon_threadsafe(self._resolve, item)
+        """"Resolve future, replies are handled in the event loop."""
+        if not self.fut.done():
+            self.fut.set_result(item)
 
     async def async_get(self, timeout: float | int) -> Any:
         """"Retrieve future."""
@@ -31,3 +30,45 @@ class ZagonelFuture:
                 return await self.fut
         finally:
             self.fut.cancel()
+
+
+class ZagonelPendingRequests:
+    """"Futures waiting for a reply, first in first out per reply key."""
+
+    def __init__(self):
+        """"Init pending requests."""
+        self._pending: dict[Hashable, deque[ZagonelFuture]] = {}
+
+    def add(self, key: Hashable, expected: Any = None) -> ZagonelFuture:
+        """"Register a future waiting for a reply matching key and expected."""
+        fut = ZagonelFuture(expected)
+        self._pending.setdefault(key, deque()).append(fut)
+        return fut
+
+    def discard(self, key: Hashable, fut: ZagonelFuture) -> None:
+        """"Forget a future, e.g. after it timed out."""
+        if (waiting := self._pending.get(key)) is None:
+            return
+        if fut in waiting:
+            waiting.remove(fut)
+        if not waiting:
+            del self._pending[key]
+
+    def resolve(self, key: Hashable, item: Any, value: Any = None) -> bool:
+        """"Resolve the oldest future waiting for key that expects value."""
+        if not (waiting := self._pending.get(key)):
+            return False
+        for fut in waiting:
+            if fut.expected is None or fut.expected == value:
+                break
+        else:
+            return False
+        waiting.remove(fut)
+        if not waiting:
+            del self._pending[key]
+        fut.resolve(item)
+        return True
+
+    def __len__(self) -> int:
+        """"Count pending futures."""
+        return sum(len(waiting) for waiting in self._pending.values())